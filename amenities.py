@@ -0,0 +1,49 @@
+import numpy as np
+
+# Bit i of the packed 'Amenities' column is AMENITY_ATTRS[i]; same order as the
+# scraper's listing_parser.AMENITIES
+AMENITY_ATTRS = [
+    'Balcony',
+    'Dishwasher',
+    'In Unit Laundry',
+    'On Site Laundry',
+    'Assigned Parking',
+    'Fitness Center',
+    'Garage Parking',
+    'Storage',
+    'Concierge Service',
+    'Swimming Pool',
+]
+AMENITY_DTYPE = np.uint16
+AMENITY_BITS = {amenity: i for i, amenity in enumerate(AMENITY_ATTRS)}
+
+
+def mask_of(amenities):
+    # Bitmask with the bits of every named amenity set
+    mask = 0
+    for amenity in amenities:
+        mask |= 1 << AMENITY_BITS[amenity]
+    return AMENITY_DTYPE(mask)
+
+def pack(columns):
+    # Packed codes from the per-amenity count columns of older rent_data.csv files;
+    # `columns` is a DataFrame or a dict of arrays, and missing counts mean 0
+    codes = np.zeros(len(columns[AMENITY_ATTRS[0]]), dtype=AMENITY_DTYPE)
+    for amenity, bit in AMENITY_BITS.items():
+        present = np.nan_to_num(np.asarray(columns[amenity], dtype=np.float64)) > 0
+        codes |= present.astype(AMENITY_DTYPE) << AMENITY_DTYPE(bit)
+    return codes
+
+def expand(codes, amenities=AMENITY_ATTRS, dtype=np.uint8, out=None):
+    # (N, len(amenities)) 0/1 dummy matrix for the requested amenities
+    codes = np.asarray(codes).astype(AMENITY_DTYPE, copy=False)
+    shifts = np.array([AMENITY_BITS[amenity] for amenity in amenities], dtype=AMENITY_DTYPE)
+    if out is None:
+        out = np.empty((len(codes), len(shifts)), dtype=dtype)
+    out[...] = (codes[:, None] >> shifts[None, :]) & 1
+    return out
+
+def has_all(codes, amenities):
+    # Boolean mask of listings with every one of the named amenities
+    mask = mask_of(amenities)
+    return (np.asarray(codes).astype(AMENITY_DTYPE, copy=False) & mask) == mask
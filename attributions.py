@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+ATTRIBUTIONS_DIR = os.path.join("models", "attributions")
+
+# Explainer built once per worker process
+_EXPLAINER = None
+_KIND = None
+
+
+def model_hash(model):
+    return hashlib.sha256(pickle.dumps(model)).hexdigest()[:16]
+
+def _make_explainer(model, kind, background, predict_attr):
+    import shap
+    if kind == 'tree':
+        return shap.TreeExplainer(model, model_output=0)
+    # Summarize the background with a set of weighted kmeans, as in the notebook
+    return shap.KernelExplainer(getattr(model, predict_attr), shap.kmeans(background, 10), link='identity')
+
+def _init_worker(model, kind, background, predict_attr):
+    global _EXPLAINER, _KIND
+    _EXPLAINER = _make_explainer(model, kind, background, predict_attr)
+    _KIND = kind
+
+def _shap_values(X):
+    if _KIND == 'tree':
+        values = _EXPLAINER.shap_values(X)
+    else:
+        values = _EXPLAINER.shap_values(X, l1_reg='num_features(10)')
+    # Single-output models (e.g. MCDropout._predict) come back as a one-element list
+    if isinstance(values, list):
+        values = values[0]
+    return np.asarray(values, dtype=np.float32)
+
+def _expected_value():
+    value = np.ravel(_EXPLAINER.expected_value)
+    return float(value[0])
+
+
+class AttributionStore:
+    """
+    SHAP attributions for every listing, computed once per model artifact and
+    stored under models/attributions/<model hash>/ as memory-mapped segments.
+    update() only explains listing ids that are not stored yet.
+
+    kind='tree' uses shap.TreeExplainer (NGBoost with tree learners); kind='kernel'
+    uses shap.KernelExplainer on model.<predict_attr> with a kmeans background,
+    for the Ridge-NGBoost and MC dropout models.
+    """
+
+    def __init__(self, model, kind='tree', background=None, predict_attr='predict', root=ATTRIBUTIONS_DIR):
+        if kind not in ('tree', 'kernel'):
+            raise ValueError(f'Unknown explainer kind: {kind}')
+        if kind == 'kernel' and background is None:
+            raise ValueError('KernelExplainer needs background data')
+        self.model = model
+        self.kind = kind
+        self.background = background
+        self.predict_attr = predict_attr
+        self.dir = os.path.join(root, model_hash(model))
+        os.makedirs(self.dir, exist_ok=True)
+        self._load()
+
+    def _meta_path(self):
+        return os.path.join(self.dir, 'meta.json')
+
+    def _load(self):
+        self.meta = {'segments': 0, 'expected_value': None}
+        if os.path.exists(self._meta_path()):
+            with open(self._meta_path(), 'r') as f:
+                self.meta = json.load(f)
+        self.segments = []
+        self.index = {}
+        for k in range(self.meta['segments']):
+            ids = np.load(os.path.join(self.dir, f'ids-{k:04d}.npy'))
+            values = np.load(os.path.join(self.dir, f'values-{k:04d}.npy'), mmap_mode='r')
+            self.segments.append(values)
+            self.index.update((listing_id, (k, row)) for row, listing_id in enumerate(ids.tolist()))
+
+    @property
+    def expected_value(self):
+        return self.meta['expected_value']
+
+    def __contains__(self, listing_id):
+        return listing_id in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def update(self, ids, X, n_workers=None, chunk_size=256):
+        """
+        Explain the rows of X (preprocessed features) whose listing ids are not
+        stored yet, in parallel chunks, and append them as a new segment.
+        Returns the number of newly explained listings.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        X = np.asarray(X)
+        new = np.array([listing_id not in self.index for listing_id in ids.tolist()], dtype=bool)
+        # Duplicate ids within the batch are explained once
+        _, first = np.unique(ids, return_index=True)
+        new &= np.isin(np.arange(len(ids)), first)
+        if not new.any():
+            return 0
+
+        new_ids, new_X = ids[new], X[new]
+        chunks = [new_X[start:start + chunk_size] for start in range(0, len(new_X), chunk_size)]
+        init_args = (self.model, self.kind, self.background, self.predict_attr)
+        with ProcessPoolExecutor(n_workers, initializer=_init_worker, initargs=init_args) as pool:
+            values = np.concatenate(list(pool.map(_shap_values, chunks)))
+            if self.meta['expected_value'] is None:
+                self.meta['expected_value'] = pool.submit(_expected_value).result()
+
+        k = self.meta['segments']
+        np.save(os.path.join(self.dir, f'ids-{k:04d}.npy'), new_ids)
+        np.save(os.path.join(self.dir, f'values-{k:04d}.npy'), values)
+        self.meta['segments'] = k + 1
+        # Segments only become visible once the metadata that counts them is replaced
+        tmp_path = self._meta_path() + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(tmp_path, self._meta_path())
+        self._load()
+        return len(new_ids)
+
+    def get(self, ids):
+        # Attributions (len(ids) x n_features) for stored listing ids
+        rows = [self.index[listing_id] for listing_id in np.atleast_1d(ids).tolist()]
+        return np.stack([self.segments[k][row] for k, row in rows])
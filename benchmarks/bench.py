@@ -0,0 +1,167 @@
+"""
+Times and records peak memory of each stage of the data/model pipeline on
+synthetic listings. Run from the repository root:
+
+    python -m benchmarks.bench --sizes 10000 100000 --out benchmarks/results
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import data_loader
+from amenities import AMENITY_ATTRS, AMENITY_DTYPE
+from neighbourhoods import get_assigner
+from preprocessing import pipeline
+
+SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+STAGES = ['build_data_matrix', '_load_data', 'train_test_split', 'fit_transform', 'transform', 'ngb_fit', 'pred_dist']
+RESULTS_DIR = os.path.join('benchmarks', 'results')
+
+
+def synthetic_listings(n, seed=69):
+    """
+    n listings in the rent_data.csv schema, placed uniformly at random inside
+    the Toronto neighbourhood polygons so every row survives the spatial join.
+    """
+    rng = np.random.default_rng(seed)
+    assigner = get_assigner()
+    min_lng, min_lat, max_lng, max_lat = np.array([g.bounds for g in assigner.geometries]).T
+    bounds = (min_lng.min(), min_lat.min(), max_lng.max(), max_lat.max())
+
+    lng, lat = [], []
+    found = 0
+    while found < n:
+        batch = max(2 * (n - found), 1000)
+        cand_lng = rng.uniform(bounds[0], bounds[2], batch)
+        cand_lat = rng.uniform(bounds[1], bounds[3], batch)
+        inside = assigner.positions(cand_lng, cand_lat) >= 0
+        lng.append(cand_lng[inside])
+        lat.append(cand_lat[inside])
+        found += inside.sum()
+    lng = np.concatenate(lng)[:n]
+    lat = np.concatenate(lat)[:n]
+
+    bedrooms = rng.choice([0, 0.5, 1, 1.5, 2, 2.5, 3, 4], n, p=[.08, .05, .3, .15, .22, .08, .09, .03])
+    bathrooms = np.clip(np.floor(bedrooms / 2) + rng.choice([1, 2], n, p=[.7, .3]), 1, 4)
+    size = np.round(350 + 300 * bedrooms + rng.normal(0, 80, n))
+    size[rng.random(n) < 0.4] = np.nan # Most listings do not state a size
+    price = np.round(1400 + 650 * bedrooms + 250 * bathrooms + rng.normal(0, 300, n), -1)
+
+    amenities = rng.integers(0, 1 << len(AMENITY_ATTRS), n).astype(AMENITY_DTYPE)
+    return pd.DataFrame({
+        'lng': lng,
+        'lat': lat,
+        'Bedrooms': bedrooms,
+        'Bathrooms': bathrooms,
+        'Size': size,
+        'Amenities': amenities,
+        'Price': price
+    })
+
+
+def measure(fn, *args, **kwargs):
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = fn(*args, **kwargs)
+        error = None
+    except MemoryError as e:
+        result, error = None, repr(e)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, {'seconds': seconds, 'peak_mb': peak / 2 ** 20, 'error': error}
+
+
+def run_size(n, stages, n_estimators, tmp_dir):
+    from ngboost import NGBRegressor
+
+    results = []
+    def record(stage, fn, *args, **kwargs):
+        if stage not in stages:
+            return None
+        out, stats = measure(fn, *args, **kwargs)
+        results.append(dict(stats, stage=stage, n_rows=n))
+        print(f'{n:>10} {stage:<18} {stats["seconds"]:9.2f}s {stats["peak_mb"]:10.1f} MB')
+        return out
+
+    rent_df = synthetic_listings(n)
+    data_matrix = record('build_data_matrix', data_loader.build_data_matrix, rent_df)
+    if data_matrix is None:
+        data_matrix = data_loader.build_data_matrix(rent_df)
+
+    geojson_path = os.path.join(tmp_dir, f'rent_final_{n}.geojson')
+    data_loader.write_geojson(data_matrix, geojson_path)
+    data_loader.DF_FINAL_PATH = geojson_path
+    record('_load_data', data_loader._load_data)
+    rent = record('train_test_split', data_loader.train_test_split, use_cache=False)
+    if rent is None:
+        rent = data_loader.train_test_split(use_cache=False)
+    os.remove(geojson_path)
+
+    data_pipeline = pipeline()
+    X_train = record('fit_transform', data_pipeline.fit_transform, rent['train']['data'])
+    if X_train is None:
+        X_train = data_pipeline.fit_transform(rent['train']['data'])
+    X_test = record('transform', data_pipeline.transform, rent['test']['data'])
+    if X_test is None:
+        X_test = data_pipeline.transform(rent['test']['data'])
+
+    ngb = NGBRegressor(n_estimators=n_estimators, verbose=False, random_state=69)
+    record('ngb_fit', ngb.fit, X_train, rent['train']['labels'].to_numpy())
+    if 'pred_dist' in stages:
+        if 'ngb_fit' not in stages:
+            ngb.fit(X_train, rent['train']['labels'].to_numpy())
+        record('pred_dist', ngb.pred_dist, X_test)
+    return results
+
+
+def _commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    parser.add_argument('--n-estimators', type=int, default=100)
+    parser.add_argument('--out', default=RESULTS_DIR)
+    args = parser.parse_args(argv)
+
+    commit = _commit()
+    report = {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'n_estimators': args.n_estimators,
+        'results': []
+    }
+    original_path = data_loader.DF_FINAL_PATH
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        try:
+            for n in args.sizes:
+                report['results'].extend(run_size(n, args.stages, args.n_estimators, tmp_dir))
+        finally:
+            data_loader.DF_FINAL_PATH = original_path
+
+    os.makedirs(args.out, exist_ok=True)
+    out_path = os.path.join(args.out, f'{commit}.json')
+    with open(out_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Wrote {out_path}')
+
+
+if __name__ == '__main__':
+    main()
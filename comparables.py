@@ -0,0 +1,147 @@
+import numpy as np
+from sklearn.neighbors import KDTree
+
+from amenities import AMENITY_DTYPE, mask_of
+
+EARTH_RADIUS = 6371000. # Metres
+BRUTE_FORCE_MAX = 2048 # Price ranges matching at most this many listings of a bucket skip the tree
+BRUTE_FORCE_CHUNK = 512 # Queries compared at once when brute forcing
+
+
+def _buckets(bedrooms, bathrooms):
+    return np.nan_to_num(np.column_stack([bedrooms, bathrooms]).astype(np.float64), nan=-1)
+
+
+class Comparables:
+    """
+    k most similar listings for a batch of query listings: same number of
+    bedrooms and bathrooms, nearest by distance, optionally with every listed
+    amenity and a price in a given range. Keeps one KDTree over projected
+    coordinates (metres) per (Bedrooms, Bathrooms) bucket.
+    """
+
+    def __init__(self, data_matrix, leaf_size=40):
+        self.labels = data_matrix.index
+        self.index = data_matrix.index.to_numpy()
+        self.lat0 = np.radians(np.nanmean(data_matrix['lat'].to_numpy(dtype=np.float64)))
+        xy = self.project(data_matrix['lng'].to_numpy(), data_matrix['lat'].to_numpy())
+        codes = data_matrix['Amenities'].to_numpy().astype(AMENITY_DTYPE, copy=False)
+        prices = data_matrix['Price'].to_numpy(dtype=np.float64)
+        located = ~np.isnan(xy).any(axis=1)
+
+        keys, inverse = np.unique(_buckets(data_matrix['Bedrooms'], data_matrix['Bathrooms'])[located],
+                                  axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        positions = np.flatnonzero(located)
+        self.buckets = {}
+        for i, key in enumerate(map(tuple, keys)):
+            rows = positions[inverse == i]
+            # Listings of a bucket sorted by price, so a price range is a contiguous slice
+            rows = rows[np.argsort(prices[rows], kind='stable')]
+            self.buckets[key] = {
+                'tree': KDTree(xy[rows], leaf_size=leaf_size),
+                'rows': rows,
+                'xy': xy[rows],
+                'codes': codes[rows],
+                'prices': prices[rows],
+            }
+
+    @classmethod
+    def from_data(cls, use_cache=True, **kwargs):
+        from data_loader import load_data
+        return cls(load_data(use_cache=use_cache), **kwargs)
+
+    def project(self, lng, lat):
+        # Equirectangular projection around Toronto's mean latitude; metres within the city
+        lng = np.radians(np.asarray(lng, dtype=np.float64))
+        lat = np.radians(np.asarray(lat, dtype=np.float64))
+        return EARTH_RADIUS * np.column_stack([lng * np.cos(self.lat0), lat])
+
+    def query(self, listings, k=20, amenities=(), price_range=None, exclude=None):
+        """
+        k comparables for every row of `listings` (lng, lat, Bedrooms, Bathrooms).
+        price_range is (low, high) in the data matrix's units (1000s of $).
+        exclude holds one data matrix index label per query to leave out (e.g.
+        the listing itself). Returns (labels, distances in metres), both
+        len(listings) x k, nearest first, padded with -1 and inf.
+        """
+        xy = self.project(listings['lng'], listings['lat'])
+        keys = _buckets(listings['Bedrooms'], listings['Bathrooms'])
+        exclude = np.full(len(xy), -1) if exclude is None else self.labels.get_indexer(np.asarray(exclude))
+        mask = mask_of(amenities)
+
+        positions = np.full((len(xy), k), -1, dtype=np.int64)
+        distances = np.full((len(xy), k), np.inf)
+        for key in map(tuple, np.unique(keys, axis=0)):
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                continue
+            queries = np.flatnonzero((keys == key).all(axis=1) & ~np.isnan(xy).any(axis=1))
+            if len(queries) == 0:
+                continue
+            lo, hi = 0, len(bucket['rows'])
+            if price_range is not None:
+                lo = np.searchsorted(bucket['prices'], price_range[0], side='left')
+                hi = np.searchsorted(bucket['prices'], price_range[1], side='right')
+            if hi - lo <= BRUTE_FORCE_MAX:
+                for start in range(0, len(queries), BRUTE_FORCE_CHUNK):
+                    chunk = queries[start:start + BRUTE_FORCE_CHUNK]
+                    positions[chunk], distances[chunk] = self._brute_force(bucket, lo, hi, xy[chunk], k, mask, exclude[chunk])
+            else:
+                positions[queries], distances[queries] = self._tree_query(bucket, xy[queries], k, mask, price_range, exclude[queries])
+        labels = np.where(positions >= 0, self.index[np.maximum(positions, 0)], -1)
+        return labels, distances
+
+    def query_index(self, labels, data_matrix, k=20, **kwargs):
+        # Comparables of listings already in the data matrix, leaving each listing out
+        listings = data_matrix.loc[labels]
+        return self.query(listings, k=k, exclude=np.asarray(labels), **kwargs)
+
+    @staticmethod
+    def _first_k(candidates, dist, valid, k):
+        # The k nearest valid candidates of each query (candidates are sorted by distance)
+        order = np.argsort(~valid, axis=1, kind='stable')[:, :k]
+        taken = np.take_along_axis(valid, order, axis=1)
+        positions = np.where(taken, np.take_along_axis(candidates, order, axis=1), -1)
+        distances = np.where(taken, np.take_along_axis(dist, order, axis=1), np.inf)
+        if positions.shape[1] < k:
+            pad = k - positions.shape[1]
+            positions = np.pad(positions, ((0, 0), (0, pad)), constant_values=-1)
+            distances = np.pad(distances, ((0, 0), (0, pad)), constant_values=np.inf)
+        return positions, distances
+
+    @classmethod
+    def _brute_force(cls, bucket, lo, hi, xy, k, mask, exclude):
+        # Few listings in the price range: compare against them directly
+        rows = bucket['rows'][lo:hi]
+        keep = (bucket['codes'][lo:hi] & mask) == mask
+        rows, ref = rows[keep], bucket['xy'][lo:hi][keep]
+        dist = np.sqrt(((xy[:, None, :] - ref[None, :, :]) ** 2).sum(axis=2))
+        order = np.argsort(dist, axis=1)[:, :k + 1]
+        candidates = rows[order]
+        dist = np.take_along_axis(dist, order, axis=1)
+        return cls._first_k(candidates, dist, candidates != exclude[:, None], k)
+
+    @classmethod
+    def _tree_query(cls, bucket, xy, k, mask, price_range, exclude):
+        # Ask the tree for more neighbours than needed, filter, and double the
+        # number asked for until every query has k matches or the bucket is exhausted
+        n = len(bucket['rows'])
+        positions = np.full((len(xy), k), -1, dtype=np.int64)
+        distances = np.full((len(xy), k), np.inf)
+        pending = np.arange(len(xy))
+        n_query = min(n, 2 * (k + 1))
+        while len(pending):
+            dist, ind = bucket['tree'].query(xy[pending], k=n_query)
+            valid = (bucket['codes'][ind] & mask) == mask
+            if price_range is not None:
+                prices = bucket['prices'][ind]
+                valid &= (prices >= price_range[0]) & (prices <= price_range[1])
+            candidates = bucket['rows'][ind]
+            valid &= candidates != exclude[pending, None]
+            positions[pending], distances[pending] = cls._first_k(candidates, dist, valid, k)
+            if n_query == n:
+                break
+            pending = pending[valid.sum(axis=1) < k]
+            n_query = min(n, 2 * n_query)
+        return positions, distances
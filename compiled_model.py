@@ -0,0 +1,145 @@
+import json
+import os
+
+import numpy as np
+
+# Only NumPy is imported at module level so compiled models load in lightweight
+# scoring processes (see scoring.py)
+
+COMPILED_PATH = os.path.join("models", "ngb_compiled")
+ARRAYS = ('feature', 'threshold', 'left', 'right', 'value', 'roots')
+
+
+def compile_model(model):
+    """
+    Flatten a fitted NGBRegressor with a Normal distribution and tree base
+    learners into contiguous node arrays. Every tree of every stage is stored
+    back to back; leaves point to themselves, and leaf values already carry
+    the -learning_rate * scaling of their stage.
+    """
+    if model.Dist.__name__ != 'Normal':
+        raise ValueError(f'Only Normal NGBoost models can be compiled, not {model.Dist.__name__}')
+    init_params = np.asarray(model.init_params, dtype=np.float64)
+    n_params = len(init_params)
+
+    per_param = [[] for _ in range(n_params)]
+    for learners, scaling, col_idx in zip(model.base_models, model.scalings, model.col_idxs):
+        for p, learner in enumerate(learners):
+            if not hasattr(learner, 'tree_'):
+                raise ValueError(f'Only tree base learners can be compiled, not {type(learner).__name__}')
+            per_param[p].append((learner.tree_, np.asarray(col_idx), -model.learning_rate * scaling))
+
+    arrays = {name: [] for name in ARRAYS[:-1]}
+    roots = np.empty((n_params, len(model.base_models)), dtype=np.int32)
+    offset = 0
+    max_depth = 0
+    for p, trees in enumerate(per_param):
+        for t, (tree, col_idx, factor) in enumerate(trees):
+            leaf = tree.children_left == -1
+            nodes = offset + np.arange(tree.node_count)
+            arrays['feature'].append(np.where(leaf, 0, col_idx[tree.feature]))
+            arrays['threshold'].append(np.where(leaf, 0., tree.threshold))
+            arrays['left'].append(np.where(leaf, nodes, offset + tree.children_left))
+            arrays['right'].append(np.where(leaf, nodes, offset + tree.children_right))
+            arrays['value'].append(tree.value[:, 0, 0] * factor)
+            roots[p, t] = offset
+            offset += tree.node_count
+            max_depth = max(max_depth, tree.max_depth)
+
+    return CompiledModel(
+        feature=np.concatenate(arrays['feature']).astype(np.int32),
+        threshold=np.concatenate(arrays['threshold']).astype(np.float64),
+        left=np.concatenate(arrays['left']).astype(np.int32),
+        right=np.concatenate(arrays['right']).astype(np.int32),
+        value=np.concatenate(arrays['value']).astype(np.float64),
+        roots=roots,
+        init_params=init_params,
+        max_depth=max_depth,
+        n_features=model.n_features,
+    )
+
+
+class CompiledNormal:
+    # Stand-in for the ngboost Normal returned by pred_dist
+    def __init__(self, params):
+        self.loc = params[:, 0]
+        self.scale = np.exp(params[:, 1])
+        self.params = {'loc': self.loc, 'scale': self.scale}
+
+    def logpdf(self, y):
+        z = (np.asarray(y) - self.loc) / self.scale
+        return -0.5 * z ** 2 - np.log(self.scale) - 0.5 * np.log(2 * np.pi)
+
+
+class CompiledModel:
+    """
+    Vectorized evaluator for compile_model() output. Every tree is walked at
+    once, one level per step, over chunks of rows. It can replace the NGBoost
+    model of a RentPredictor; predictions agree with the original up to
+    floating point summation order.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, init_params, max_depth, n_features):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.init_params = np.asarray(init_params, dtype=np.float64)
+        self.max_depth = max_depth
+        self.n_features = n_features
+
+    def save(self, path=COMPILED_PATH):
+        os.makedirs(path, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(path, f'{name}.npy'), getattr(self, name))
+        meta = {
+            'init_params': self.init_params.tolist(),
+            'max_depth': int(self.max_depth),
+            'n_features': int(self.n_features),
+        }
+        # Written last, so a directory without meta.json is an unfinished export
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def load(cls, path=COMPILED_PATH, mmap_mode='r'):
+        with open(os.path.join(path, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode) for name in ARRAYS}
+        return cls(**arrays, **meta)
+
+    def pred_param(self, X, max_elements=2 ** 24):
+        # Same float32 inputs that sklearn's trees compare against their thresholds
+        X = np.asarray(X, dtype=np.float32)
+        n_params, n_trees = self.roots.shape
+        roots = np.ravel(self.roots)
+        params = np.empty((len(X), n_params))
+        params[:] = self.init_params
+
+        chunk_size = max(1, max_elements // len(roots))
+        for start in range(0, len(X), chunk_size):
+            x = X[start:start + chunk_size]
+            rows = np.arange(len(x))[:, None]
+            node = np.repeat(roots[None, :], len(x), axis=0)
+            for _ in range(self.max_depth):
+                go_left = x[rows, self.feature[node]] <= self.threshold[node]
+                node = np.where(go_left, self.left[node], self.right[node])
+            params[start:start + len(x)] += self.value[node].reshape(len(x), n_params, n_trees).sum(axis=2)
+        return params
+
+    def pred_dist(self, X):
+        return CompiledNormal(self.pred_param(X))
+
+    def predict(self, X):
+        return self.pred_dist(X).loc
+
+
+if __name__ == '__main__':
+    import pickle
+    from predictor import NGB_PATH
+    with open(NGB_PATH, 'rb') as f:
+        compiled = compile_model(pickle.load(f))
+    compiled.save()
+    print(f'Compiled {compiled.roots.size} trees ({len(compiled.value)} nodes) to {COMPILED_PATH}.')
@@ -0,0 +1,131 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+from sklearn.ensemble import GradientBoostingRegressor
+from sklearn.linear_model import Ridge
+from sklearn.metrics import mean_absolute_error
+from sklearn.model_selection import KFold
+
+from shared import SharedArrays, attach
+
+N_SPLITS = 7
+
+# Training matrix shared by the parent process, attached once per worker
+_ARRAYS = {}
+_BLOCKS = []
+
+
+def _fit_ngb(X, y, base=None):
+    from ngboost import NGBRegressor
+    kwargs = {} if base is None else {'Base': base}
+    return NGBRegressor(verbose=False, **kwargs).fit(X, y)
+
+def _predict_ngb(ngb, X, y):
+    y_dists = ngb.pred_dist(X)
+    return y_dists.params['loc'], -y_dists.logpdf(y)
+
+def _fit_dist(X, y):
+    from estimators import DistributionEstimator
+    mu_estimator = GradientBoostingRegressor(max_features='sqrt')
+    sigma2_estimator = GradientBoostingRegressor(max_features='sqrt')
+    return DistributionEstimator(mu_estimator, sigma2_estimator).fit(X, y)
+
+def _predict_dist(dist_model, X, y):
+    preds = dist_model.predict(X)
+    return preds.mean(), -np.log(preds.pdf(y))
+
+def _fit_mcn(X, y):
+    from mc_dropout import MCDropout
+    mcn = MCDropout(X.shape[1], hidd_dim=50, drop_rate=0.2, tau=0.9)
+    mcn.fit(X, y, n_epochs=700)
+    return mcn
+
+def _predict_mcn(mcn, X, y):
+    preds = mcn.mc_predict(X, T=500)
+    return preds.mean(axis=0), mcn.negative_log_likelihood(X, y, preds=preds)
+
+# (fit, predict) pairs; predict returns the predicted mean and per-row NLL
+MODELS = {
+    'Multiple Regressors': (_fit_dist, _predict_dist),
+    'NN w/ Monte Carlo Dropout': (_fit_mcn, _predict_mcn),
+    'NGB w/ Decision Tree WL': (_fit_ngb, _predict_ngb),
+    'NGB w/ Ridge Regression WL': (partial(_fit_ngb, base=Ridge()), _predict_ngb),
+}
+
+
+def _init_worker(specs):
+    global _ARRAYS, _BLOCKS
+    # One BLAS/OpenMP/torch thread per worker; the pool already uses every core.
+    # NumPy's BLAS is loaded by now, so the limits are set on the libraries directly
+    import torch
+    from threadpoolctl import threadpool_limits
+    threadpool_limits(1)
+    torch.set_num_threads(1)
+    _ARRAYS, _BLOCKS = attach(specs)
+
+def _run_fold(name, fold, train_idx, test_idx):
+    fit, predict = MODELS[name]
+    X, y = _ARRAYS['X'], _ARRAYS['y']
+    X_train, y_train = X[train_idx], y[train_idx]
+    X_test, y_test = X[test_idx], y[test_idx]
+
+    start = time.perf_counter()
+    model = fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    mean, nll = predict(model, X_test, y_test)
+    predict_seconds = time.perf_counter() - start
+    return {
+        'model': name,
+        'fold': fold,
+        'nll': float(np.mean(nll)),
+        'mae': float(mean_absolute_error(y_test, mean)),
+        'fit_seconds': fit_seconds,
+        'predict_seconds': predict_seconds
+    }
+
+def cross_validate(X, y, models=tuple(MODELS), n_splits=N_SPLITS, n_workers=None):
+    """
+    K-fold cross-validation of every model in `models` with all (model, fold)
+    pairs run in a process pool. X is preprocessed once by the caller and read
+    by the workers from shared memory. Returns one result dict per fold.
+    """
+    kf = KFold(n_splits=n_splits)
+    folds = list(kf.split(X))
+    tasks = [(name, fold, train, test) for name in models for fold, (train, test) in enumerate(folds)]
+
+    arrays = {'X': np.asarray(X, dtype=np.float64), 'y': np.asarray(y, dtype=np.float64)}
+    with SharedArrays(arrays) as shared, \
+            ProcessPoolExecutor(n_workers or os.cpu_count(), initializer=_init_worker, initargs=(shared.specs,)) as pool:
+        return list(pool.map(_run_fold, *zip(*tasks)))
+
+def summarize(results):
+    scores = {}
+    for name in dict.fromkeys(result['model'] for result in results):
+        rows = [result for result in results if result['model'] == name]
+        nll = np.array([row['nll'] for row in rows])
+        mae = np.array([row['mae'] for row in rows])
+        scores[name] = {
+            'mean': nll.mean(),
+            'std': nll.std(),
+            'mae': mae.mean(),
+            'seconds': sum(row['fit_seconds'] + row['predict_seconds'] for row in rows)
+        }
+    return scores
+
+
+if __name__ == '__main__':
+    from data_loader import train_test_split
+    from preprocessing import pipeline
+
+    rent = train_test_split()
+    X_train_final = pipeline().fit_transform(rent['train']['data'])
+    y_train = rent['train']['labels'].to_numpy()
+
+    results = cross_validate(X_train_final, y_train)
+    for name, score in summarize(results).items():
+        print('{}: {:0.2f} +- {:0.2f} (MAE {:0.3f}, {:0.0f}s)'.format(
+            name, score['mean'], score['std'], score['mae'], score['seconds']))
@@ -1,39 +1,209 @@
 import pandas as pd
-import geopandas as gpd
 import numpy as np
-import sklearn as sk
 import os
-from sklearn.model_selection import StratifiedShuffleSplit
+import hashlib
+from amenities import AMENITY_ATTRS, AMENITY_DTYPE, pack
+
+# geopandas, shapely (via neighbourhoods), pyarrow and sklearn are imported by the
+# functions that need them, so importing data_loader stays cheap
 
 NBHDS_PATH = os.path.join("data", "Neighbourhoods.geojson")
 NBHD_PROFILES_PATH = os.path.join("data", "neighbourhood_profiles.csv")
 RENT_LISTINGS_PATH = os.path.join("data", "rent_data.csv")
 DF_FINAL_PATH = os.path.join('data', 'rent_final.geojson')
+CACHE_DIR = os.path.join('data', 'cache')
 
+CHUNK_SIZE = 100000
 
-def _load_data():
-    data_matrix = gpd.read_file(DF_FINAL_PATH)
+# Compact dtypes for rent_data.csv: amenities are bit-packed into one column
+# (older files have one 0/1/2 count column per amenity instead)
+LISTING_DTYPES = {
+    'lng': np.float32,
+    'lat': np.float32,
+    'Bedrooms': np.float32,
+    'Bathrooms': np.float32,
+    'Size': np.float32,
+    'Amenities': AMENITY_DTYPE,
+    'Balcony': np.uint8,
+    'Dishwasher': np.uint8,
+    'In Unit Laundry': np.uint8,
+    'On Site Laundry': np.uint8,
+    'Assigned Parking': np.uint8,
+    'Fitness Center': np.uint8,
+    'Garage Parking': np.uint8,
+    'Storage': np.uint8,
+    'Concierge Service': np.uint8,
+    'Swimming Pool': np.uint8,
+    'Price': np.float32,
+}
+AREA_CODE_DTYPE = np.uint8 # AREA_SHORT_CODE runs from 1 to 140
+
+# Bump whenever the cleaning rules in _load_data change so stale caches are not reused
+CLEANING_VERSION = 5
+
+# One-off fixes to listings of rent_data.csv, keyed on their content so they hit the
+# same listings in any file or row order: (lng, lat, Bedrooms, Bathrooms, Price in $)
+# and the corrected Price in $, or None to drop the listing
+LISTING_FIXES = [
+    ((-79.3867634, 43.6702312, 10, 5, 625), None), # Listing error
+    ((-79.4036115, 43.7262601, 2, 1, 21500), None), # Parsing error
+    ((-79.3871212, 43.645266, 2, 2, 17000), 9500), # Update listing; parsing error
+]
+COORD_TOL = 1e-5 # Degrees; lng/lat are read as float32
+
+
+def build_data_matrix(rent_df, assigner=None):
+    # Tag listings with the AREA_SHORT_CODE of their neighbourhood; same rows as the
+    # notebook's gpd.sjoin(rent_df_geo, nbhd_df, how='left') + AREA_NAME filter.
+    # Profile attributes are joined at transform time by preprocessing.ProfileJoiner
+    if assigner is None:
+        from neighbourhoods import get_assigner
+        assigner = get_assigner()
+    rent_df = rent_df[rent_df['lat'].notna()] # Remove points that have no coordinates
+    pos = assigner.positions(rent_df['lng'].to_numpy(), rent_df['lat'].to_numpy())
+
+    # Remove points that are not in the City of Toronto
+    inside = pos >= 0
+    rent_df = rent_df[inside]
+    pos = pos[inside]
+    return rent_df.assign(AREA_SHORT_CODE=assigner.codes[pos].astype(AREA_CODE_DTYPE))
+
+def write_geojson(data_matrix, path):
+    # The index (row numbers of rent_data.csv) is written as an 'index' column so
+    # _load_data labels rows like clean_chunks does
+    import geopandas as gpd
+    gdf = gpd.GeoDataFrame(data_matrix, geometry=gpd.points_from_xy(data_matrix.lng, data_matrix.lat))
+    gdf.to_file(path, driver="GeoJSON", index=True)
+
+def build_rent_final(listings_path=RENT_LISTINGS_PATH, out_path=DF_FINAL_PATH):
+    rent_df = pd.read_csv(listings_path)
+    data_matrix = build_data_matrix(rent_df)
+    write_geojson(data_matrix, out_path)
+    return data_matrix
+
+def _drop_joined(data_matrix):
+    # rent_final.geojson files written before the profiles were normalized carry the
+    # joined profile columns, geometry and index_right on every row
+    from neighbourhoods import profile_table
+    joined = ['geometry', 'index_right'] + [attr for attr in profile_table().columns if attr in data_matrix.columns]
+    data_matrix = pd.DataFrame(data_matrix.drop(joined, axis=1, errors='ignore'))
+    data_matrix['AREA_SHORT_CODE'] = data_matrix['AREA_SHORT_CODE'].astype(AREA_CODE_DTYPE)
+    return data_matrix
+
+def _pack_amenities(data_matrix):
+    # Replace per-amenity columns with the single bit-packed 'Amenities' column
+    legacy = [attr for attr in AMENITY_ATTRS if attr in data_matrix.columns]
+    if not legacy:
+        return data_matrix
+    if 'Amenities' not in data_matrix.columns:
+        data_matrix = data_matrix.assign(Amenities=pack(data_matrix))
+    return data_matrix.drop(legacy, axis=1)
+
+def prepare_listings(rent_df):
+    # Join and fix new listings for scoring; the training-only filters are skipped
+    data_matrix = _pack_amenities(build_data_matrix(rent_df))
+    data_matrix['Bathrooms'] = data_matrix[['Bathrooms']].replace({11: 1, 21: 2}) # Parsing error: 11 -> 1, 21 -> 2
+    return data_matrix
+
+def _fix_listings(data_matrix):
+    for (lng, lat, bedrooms, bathrooms, price), new_price in LISTING_FIXES:
+        match = (np.isclose(data_matrix['lng'], lng, rtol=0, atol=COORD_TOL)
+                 & np.isclose(data_matrix['lat'], lat, rtol=0, atol=COORD_TOL)
+                 & (data_matrix['Bedrooms'] == bedrooms) & (data_matrix['Bathrooms'] == bathrooms)
+                 & (data_matrix['Price'] == price))
+        if new_price is None:
+            data_matrix = data_matrix[~match]
+        else:
+            data_matrix.loc[match, 'Price'] = new_price
+    return data_matrix
+
+def _clean(data_matrix):
+    data_matrix = _pack_amenities(data_matrix)
     data_matrix = data_matrix[data_matrix['Bathrooms'].notna()]
 
     # Removing points in certain neighbourhoods so that we can use stratified splitting
     remove_nbhds = [3.0, 5.0, 133.0, 21.0]
     data_matrix = data_matrix[~data_matrix["AREA_SHORT_CODE"].isin(remove_nbhds)]
 
-    # Make 'Laundry' feature into one hot vector
-    data_matrix['On Site Laundry'] = data_matrix[['On Site Laundry']].replace({2: 1})
+    # Amenity bits only record presence, so 'On Site Laundry' listed twice is already a 1
+
+    # Remove outliers and fix data collection mistakes
+    data_matrix = _fix_listings(data_matrix)
 
     # Make 'Price' values in 1000s ($)
     data_matrix['Price'] = data_matrix['Price'] / 1000
-
-    # Remove outliers and fix data collection mistakes
-    data_matrix.drop(index=2663, inplace=True) # Listing error
-    data_matrix.drop(index=2752, inplace=True) # Parsing error
-    data_matrix.loc[data_matrix.index == 6006, 'Price'] = 9.5 # Update listing; parsing error
     data_matrix['Bathrooms'] = data_matrix[['Bathrooms']].replace({11: 1, 21: 2}) # Parsing error: 11 -> 1, 21 -> 2
     return data_matrix
 
-def train_test_split(test_prop=0.15):
+def _load_data():
+    import geopandas as gpd
+    data_matrix = gpd.read_file(DF_FINAL_PATH)
+    if 'index' in data_matrix.columns:
+        # Files from write_geojson keep the rent_data.csv row numbers as labels
+        data_matrix = data_matrix.set_index('index').rename_axis(None)
+    return _clean(_drop_joined(data_matrix))
+
+def read_listings_chunked(path=RENT_LISTINGS_PATH, chunksize=CHUNK_SIZE):
+    # Stream a listings CSV in fixed-size chunks; the index keeps counting across
+    # chunks so it matches the row labels of a whole-file read
+    with pd.read_csv(path, dtype=LISTING_DTYPES, chunksize=chunksize) as reader:
+        yield from reader
+
+def clean_chunks(chunks, assigner=None):
+    # Apply the neighbourhood join and the _load_data rules chunk by chunk
+    for chunk in chunks:
+        data_matrix = _clean(build_data_matrix(chunk, assigner))
+        if len(data_matrix):
+            yield data_matrix
+
+def iter_data_matrix(path=RENT_LISTINGS_PATH, chunksize=CHUNK_SIZE):
+    return clean_chunks(read_listings_chunked(path, chunksize))
+
+def _cache_key(paths):
+    digest = hashlib.sha256(f'v{CLEANING_VERSION}'.encode())
+    for path in paths:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()[:16]
+
+def _write_cache(data_matrix, path):
+    # One record batch and plain NumPy buffers (NaN stays NaN rather than becoming a
+    # null), so every column can be handed to pandas without copying
+    import pyarrow as pa
+    from pyarrow import feather
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    df = data_matrix.reset_index()
+    table = pa.table({col: pa.array(df[col].to_numpy()) for col in df.columns})
+    tmp_path = path + '.tmp'
+    feather.write_feather(table, tmp_path, compression='uncompressed', chunksize=max(len(table), 1))
+    os.replace(tmp_path, path)
+
+def _read_cache(path):
+    # Uncompressed Arrow IPC, memory-mapped: the columns are read-only views of the
+    # file. DataFrame(copy=False) keeps one block per column instead of
+    # consolidating them, which would copy everything onto the heap
+    from pyarrow import feather
+    table = feather.read_table(path, memory_map=True)
+    if table.num_rows == 0:
+        return table.to_pandas().set_index('index').rename_axis(None)
+    columns = {name: table.column(name).chunk(0).to_numpy(zero_copy_only=True) for name in table.column_names}
+    index = pd.Index(columns.pop('index'), copy=False)
+    return pd.DataFrame(columns, index=index, copy=False)
+
+def load_data(use_cache=True):
+    if not use_cache:
+        return _load_data()
+    cache_path = os.path.join(CACHE_DIR, f'data_matrix-{_cache_key([DF_FINAL_PATH])}.feather')
+    if os.path.exists(cache_path):
+        return _read_cache(cache_path)
     data_matrix = _load_data()
+    _write_cache(data_matrix, cache_path)
+    return data_matrix
+
+def train_test_split(test_prop=0.15, use_cache=True):
+    from sklearn.model_selection import StratifiedShuffleSplit
+    data_matrix = load_data(use_cache=use_cache)
     # Stratify on area code
     split = StratifiedShuffleSplit(n_splits = 1, test_size=test_prop, random_state=69)
     for train_idx, test_idx in split.split(data_matrix, data_matrix[['AREA_SHORT_CODE']]):
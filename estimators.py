@@ -0,0 +1,41 @@
+import numpy as np
+from scipy.stats import norm
+from sklearn.base import BaseEstimator
+from sklearn.model_selection import train_test_split
+
+
+class DistributionEstimator(BaseEstimator):
+    # A multi-output regressor that uses two regressors two learn
+    # mu and sigma for price ~ N(mu, sigma)
+
+    def __init__(self, mu_estimator, sigma2_estimator):
+        self.mu_estimator = mu_estimator
+        self.sigma2_estimator = sigma2_estimator
+
+    def fit(self, X, y):
+        X_mean, X_sd, y_mean, y_sd = train_test_split(X, y, test_size=0.5)
+        self.mu_estimator.fit(X_mean, y_mean)
+        mean_pred = self.mu_estimator.predict(X_sd)
+        # Train on log((y - yhat)^2) to force positive values
+        sq_resid = np.log((mean_pred - y_sd) ** 2)
+        self.sigma2_estimator.fit(X_sd, sq_resid)
+        return self
+
+    def predict(self, X):
+        mu = self.mu_estimator.predict(X)
+        sigma_sq = np.exp(self.sigma2_estimator.predict(X))
+        sigma = np.sqrt(sigma_sq)
+        return norm(loc=mu, scale=sigma)
+
+    def mu_estimator_(self):
+        return self.mu_estimator
+
+    def sigma2_estimator_(self):
+        return self.sigma2_estimator
+
+# Scoring function for above estimator: log-likelihood under Gaussian
+def log_likelihood(estimator, X, y):
+    # Assumes estimator.predict returns a frozen scipy.stats.norm object
+    preds = estimator.predict(X)
+    log_lls = -np.log(preds.pdf(y))
+    return np.mean(log_lls)
@@ -0,0 +1,100 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+from sklearn.base import BaseEstimator, TransformerMixin, clone
+from sklearn.compose import ColumnTransformer
+from sklearn.pipeline import Pipeline
+
+# Set to a file path to append per-stage metrics as JSON lines; unset disables them
+METRICS_ENV = 'RENT_METRICS'
+
+_lock = threading.Lock()
+
+
+def metrics_path():
+    return os.environ.get(METRICS_ENV)
+
+def log_event(event, path=None):
+    path = path or metrics_path()
+    if not path:
+        return
+    event = dict(event, ts=time.time(), pid=os.getpid())
+    with _lock, open(path, 'a') as f:
+        f.write(json.dumps(event) + '\n')
+
+
+class StageTimer:
+    """
+    Context manager recording wall time, rows processed and peak traced memory
+    of one named stage. Memory is only traced while a stage runs.
+    """
+
+    def __init__(self, name, phase, rows=None, path=None):
+        self.event = {'kind': 'stage', 'name': name, 'phase': phase, 'rows': rows}
+        self.path = path
+
+    def __enter__(self):
+        self.started_tracing = not tracemalloc.is_tracing()
+        if self.started_tracing:
+            tracemalloc.start()
+        self.base, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        _, peak = tracemalloc.get_traced_memory()
+        if self.started_tracing:
+            tracemalloc.stop()
+        log_event(dict(self.event, seconds=seconds, peak_bytes=max(peak - self.base, 0)), self.path)
+
+
+class TimedStep(BaseEstimator, TransformerMixin):
+    # Wraps a pipeline step so each fit/transform call is logged under its step name
+    def __init__(self, name, estimator):
+        self.name = name
+        self.estimator = estimator
+
+    def fit(self, X, y=None):
+        self.estimator_ = clone(self.estimator)
+        with StageTimer(self.name, 'fit', len(X)):
+            self.estimator_.fit(X, y)
+        return self
+
+    def transform(self, X):
+        with StageTimer(self.name, 'transform', len(X)):
+            return self.estimator_.transform(X)
+
+    def fit_transform(self, X, y=None):
+        self.estimator_ = clone(self.estimator)
+        with StageTimer(self.name, 'fit_transform', len(X)):
+            return self.estimator_.fit_transform(X, y)
+
+
+def unwrap(step):
+    # The fitted estimator of a pipeline step, whether or not instrument() wrapped it
+    return getattr(step, 'estimator_', step)
+
+def instrument(estimator):
+    """
+    Wrap every named step of a (possibly nested) Pipeline/ColumnTransformer in
+    TimedStep. Returns the estimator unchanged when metrics are disabled, so
+    there is no overhead unless RENT_METRICS is set.
+    """
+    if not metrics_path():
+        return estimator
+    if isinstance(estimator, ColumnTransformer):
+        estimator.transformers = [
+            (name, instrument(transformer) if isinstance(transformer, (Pipeline, ColumnTransformer)) else transformer, cols)
+            for name, transformer, cols in estimator.transformers
+        ]
+    elif isinstance(estimator, Pipeline):
+        estimator.steps = [
+            (name, instrument(step) if isinstance(step, (Pipeline, ColumnTransformer)) else TimedStep(name, step))
+            for name, step in estimator.steps
+        ]
+    return estimator
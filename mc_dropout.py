@@ -0,0 +1,165 @@
+import numpy as np
+import torch
+from torch import nn
+from torch import optim
+
+
+class MCDropout(nn.Module):
+    """
+    Defines the architecture of a fully connected network with a single hidden
+    layer w/ tanh non-linearity, with negative gaussian log-likelihood objective.
+    """
+
+    def __init__(self, in_dim, hidd_dim=128, non_linearity='tanh', drop_rate=0.2, tau=1.0):
+        super(MCDropout, self).__init__()
+        self.drop_rate = drop_rate
+        self.dropout1 = nn.Dropout(p=drop_rate)
+        self.pre_hidd_layer = nn.Linear(in_features=in_dim, out_features=hidd_dim)
+        activations = {
+            'tanh': nn.Tanh,
+            'logistic': nn.Sigmoid,
+            'relu': nn.ReLU
+         }
+        self.activation = activations[non_linearity]()
+        self.dropout2 = nn.Dropout(p=drop_rate)
+        self.out_layer = nn.Linear(in_features=hidd_dim, out_features=1)
+        self.tau = tau # Model precision; used for regularization (i.e., y | f ~ N(f, tau^-1 * I))
+
+    def forward(self, x):
+        """
+        Produces an N-dimensional vector given a batch of
+        (in_dim)-dimensional vectors.
+
+        Input
+        _____
+        x: BS x in_dim
+
+        Output
+        ______
+        out: BS x 1
+        """
+        x = self.dropout1(x)
+        x = self.pre_hidd_layer(x)
+        x = self.activation(x)
+        x = self.dropout2(x)
+        return self.out_layer(x)
+
+    def fit(self, train_X, train_y, val_X=None, val_y=None, n_batches=6, n_epochs=100):
+        """
+        Backpropogate through layers to find the optimal model
+        parameters that minimizes maximizes the negative gaussian log-likelihood.
+        test_X and test_y are a hold-out set for which we evaluate the model's training.
+        """
+
+        # Convert numpy arrays to tensors
+        train_X = torch.from_numpy(train_X).float()
+        train_y = torch.from_numpy(train_y).float()
+        if val_X is not None and val_y is not None:
+            val_X = torch.from_numpy(val_X).float()
+            val_y = torch.from_numpy(val_y).float()
+
+        # Weight penalty
+        N = train_X.size()[0]
+        lengthscale = 1e-2
+        reg = lengthscale**2 * self.drop_rate / (2. * N * self.tau)
+
+        batch_size = int(np.floor(N / n_batches))
+        optimizer = optim.Adam(self.parameters(), weight_decay=reg)
+
+        # Set model to training mode to turn on dropout layers
+        self.train()
+
+        for i in range(n_epochs):
+            for batch_i in range(n_batches + 1):
+
+                # Subsample mini-batch from training set
+                if batch_i != n_batches:
+                    idx = slice(batch_i * batch_size, (batch_i + 1) * batch_size)
+                else:
+                    idx = slice(batch_i * batch_size, train_X.size()[0])
+                objective = self.objective(train_X[idx, :], train_y[idx])
+
+                # Compute gradients and take gradient step
+                optimizer.zero_grad()
+                objective.backward()
+                optimizer.step()
+
+            if val_X is not None and ((i + 1) % 10 == 0):
+                print(f'Test loss at epoch [{i + 1}/{n_epochs}]: {self.objective(val_X, val_y)}')
+
+    @torch.no_grad()
+    def mc_predict(self, X, T=1000, max_elements=2 ** 25):
+        """
+        Make T draws from the posterior predictive distribution.
+
+        All T dropout masks are applied in one batched pass (T x N x hidd_dim)
+        instead of T separate forward passes. Rows are streamed in chunks so
+        that no intermediate tensor holds more than max_elements values.
+        """
+        X = torch.as_tensor(np.asarray(X), dtype=torch.float32)
+        if X.dim() == 1:
+            X = X[None, :]
+        N, in_dim = X.shape
+        hidd_dim = self.pre_hidd_layer.out_features
+        keep = 1. - self.drop_rate
+
+        W1, b1 = self.pre_hidd_layer.weight, self.pre_hidd_layer.bias
+        w2, b2 = self.out_layer.weight[0], self.out_layer.bias[0]
+
+        y_hat = torch.empty(T, N)
+        chunk_size = max(1, max_elements // (T * max(in_dim, hidd_dim)))
+        for start in range(0, N, chunk_size):
+            x = X[start:start + chunk_size]
+            n = x.shape[0]
+            # Same masks as nn.Dropout in training mode: drop w.p. drop_rate, rescale by 1 / keep
+            mask1 = torch.empty(T, n, in_dim).bernoulli_(keep).div_(keep)
+            h = torch.matmul(x[None] * mask1, W1.T).add_(b1)
+            h = self.activation(h)
+            mask2 = torch.empty(T, n, hidd_dim).bernoulli_(keep).div_(keep)
+            y_hat[:, start:start + n] = torch.matmul(h.mul_(mask2), w2).add_(b2)
+
+        return y_hat.numpy().squeeze()
+
+    def _predict(self, X):
+        """
+        Make single prediction with dropout layers turned off.
+        """
+        X = torch.from_numpy(X).float()
+
+        # Set to evaluation mode
+        self.eval()
+        y_hat = self.forward(X).detach().numpy()
+
+        # Convert float64 to satisfy shap
+        return y_hat.astype(np.float64)
+
+    def objective(self, xs, ys):
+        y_pred = self.forward(xs).squeeze()
+        ys = ys.squeeze()
+        if (ys.size() != y_pred.size()):
+            print(f'Prediction size: {y_pred.size()}, Target size: {ys.size()}')
+        return torch.nn.MSELoss(reduction='sum')(y_pred, ys)
+
+    @torch.no_grad()
+    def negative_log_likelihood(self, test_X, test_y, T=500, preds=None):
+        """
+        Return the negative log-likelihood for each instance in test_X.
+        Draws already made with mc_predict can be reused by passing preds.
+        """
+        if preds is None:
+            preds = self.mc_predict(test_X, T=T)
+        preds = torch.as_tensor(np.asarray(preds), dtype=torch.float64)
+        if preds.dim() == 1:
+            preds = preds[:, None]
+        T = preds.shape[0]
+        test_y = torch.as_tensor(np.asarray(test_y), dtype=torch.float64).reshape(1, -1)
+        ll = (torch.logsumexp(-0.5 * self.tau * (test_y - preds)**2., 0) - np.log(T)
+            - 0.5*np.log(2*np.pi) + 0.5*np.log(self.tau))
+        return (-ll).numpy()
+
+    def score(self, test_X, test_y, T=500):
+        """
+        Return the average negative log-likelihood over all instances in test_X.
+        """
+        nll = self.negative_log_likelihood(test_X, test_y, T=T)
+        return np.mean(nll)
@@ -0,0 +1,77 @@
+import json
+import os
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import shapely
+from shapely.geometry import shape
+
+NBHD_FINAL_PATH = os.path.join("data", "nbhd_final.geojson")
+
+
+class NeighbourhoodAssigner:
+    """
+    Assigns listing coordinates to Toronto neighbourhoods. The polygons are
+    indexed once in an STRtree, so tagging a batch of points is a single
+    vectorized tree query instead of a GeoDataFrame spatial join.
+    """
+
+    def __init__(self, geometries, codes, profiles=None):
+        self.geometries = np.asarray(geometries, dtype=object)
+        self.codes = np.asarray(codes, dtype=np.float64)
+        self.profiles = profiles
+        shapely.prepare(self.geometries)
+        self.tree = shapely.STRtree(self.geometries)
+
+    @classmethod
+    def from_geojson(cls, path=NBHD_FINAL_PATH):
+        with open(path, 'r') as f:
+            features = json.load(f)['features']
+        geometries = [shape(feature['geometry']) for feature in features]
+        profiles = pd.DataFrame([feature['properties'] for feature in features])
+        return cls(geometries, profiles['AREA_SHORT_CODE'].to_numpy(), profiles=profiles)
+
+    def positions(self, lng, lat):
+        """
+        Row position of the polygon containing each (lng, lat) point, or -1 for
+        points outside the City of Toronto (or with missing coordinates).
+        """
+        lng = np.atleast_1d(np.asarray(lng, dtype=np.float64))
+        lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        points = shapely.points(lng, lat)
+        # Same predicate as gpd.sjoin's default so boundary points are kept
+        pt_idx, poly_idx = self.tree.query(points, predicate='intersects')
+
+        pos = np.full(len(points), -1, dtype=np.int64)
+        if len(pt_idx):
+            # A point on a shared boundary matches more than one polygon; keep the first
+            order = np.lexsort((poly_idx, pt_idx))
+            pt_idx, poly_idx = pt_idx[order], poly_idx[order]
+            first = np.r_[True, pt_idx[1:] != pt_idx[:-1]]
+            pos[pt_idx[first]] = poly_idx[first]
+        return pos
+
+    def assign(self, lng, lat):
+        # AREA_SHORT_CODE for each point, NaN where the point is not in Toronto
+        pos = self.positions(lng, lat)
+        codes = np.full(len(pos), np.nan)
+        inside = pos >= 0
+        codes[inside] = self.codes[pos[inside]]
+        return codes
+
+    def assign_one(self, lng, lat):
+        # Fast path for a single streamed listing
+        matches = self.tree.query(shapely.Point(lng, lat), predicate='intersects')
+        if len(matches) == 0:
+            return None
+        return self.codes[matches.min()]
+
+
+@lru_cache(maxsize=None)
+def get_assigner(path=NBHD_FINAL_PATH):
+    return NeighbourhoodAssigner.from_geojson(path)
+
+def profile_table(path=NBHD_FINAL_PATH):
+    # One row of census profile attributes per neighbourhood, indexed by AREA_SHORT_CODE
+    return get_assigner(path).profiles.set_index('AREA_SHORT_CODE')
@@ -0,0 +1,229 @@
+import os
+import json
+import pickle
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+
+from amenities import AMENITY_ATTRS, pack
+from data_loader import prepare_listings
+from preprocessing import pipeline
+
+NGB_PATH = os.path.join("models", "ngb_model.sav")
+PREDICTOR_PATH = os.path.join("models", "rent_predictor.sav")
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+REQUIRED_ATTRS = ('lng', 'lat', 'Bedrooms', 'Bathrooms')
+OPTIONAL_ATTRS = ('Size', 'Amenities')
+
+
+class RentPredictor:
+    """
+    Bundles a fitted preprocessing.pipeline() with the NGBRegressor trained on
+    its output, so new listings are scored without refitting the preprocessing.
+    """
+
+    def __init__(self, data_pipeline, model, quantiles=QUANTILES):
+        self.data_pipeline = data_pipeline
+        self.model = model
+        self.quantiles = np.asarray(quantiles, dtype=np.float64)
+        self._z = norm.ppf(self.quantiles)
+
+    @classmethod
+    def from_model(cls, model, X_train, n_neighbors=5, mul=True, **kwargs):
+        # Wrap an already trained model (e.g. models/ngb_model.sav) with the pipeline it was trained on
+        data_pipeline = pipeline(n_neighbors=n_neighbors, mul=mul)
+        data_pipeline.fit(X_train)
+        return cls(data_pipeline, model, **kwargs)
+
+    def save(self, path=PREDICTOR_PATH):
+        with open(path, 'wb') as f:
+            pickle.dump(self, f)
+
+    @classmethod
+    def load(cls, path=PREDICTOR_PATH):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    def transform(self, X):
+        return self.data_pipeline.transform(X)
+
+    def predict_batch(self, X):
+        return self.model.predict(self.transform(X))
+
+    def pred_dist_batch(self, X):
+        """
+        Predictive distribution for every row of the data matrix X. Returns the
+        mean, sigma and the requested quantiles (N x len(quantiles)) of price.
+        """
+        dist = self.model.pred_dist(self.transform(X))
+        mean = np.asarray(dist.params['loc'])
+        sigma = np.asarray(dist.params['scale'])
+        return {
+            'mean': mean,
+            'sigma': sigma,
+            'quantiles': mean[:, None] + sigma[:, None] * self._z[None, :]
+        }
+
+    def score_listings(self, listings):
+        """
+        Score raw listings (rent_data.csv schema). Listings outside the City of
+        Toronto get None since the model has no neighbourhood profile for them.
+        """
+        rent_df = _listing_frame(listings)
+        data_matrix = prepare_listings(rent_df)
+        results = [None] * len(rent_df)
+        if len(data_matrix) == 0:
+            return results
+        preds = self.pred_dist_batch(data_matrix)
+        positions = rent_df.index.get_indexer(data_matrix.index)
+        for i, pos in enumerate(positions):
+            results[pos] = {
+                'mean': float(preds['mean'][i]),
+                'sigma': float(preds['sigma'][i]),
+                'quantiles': dict(zip(self.quantiles.tolist(), preds['quantiles'][i].tolist()))
+            }
+        return results
+
+
+def _listing_frame(listings):
+    # Every listing gets the same columns whatever else is in its batch: a missing
+    # Size is imputed downstream and missing Amenities mean none (or are packed
+    # from the per-amenity columns of older rent_data.csv files)
+    rent_df = pd.DataFrame.from_records(listings)
+    attrs = list(REQUIRED_ATTRS + OPTIONAL_ATTRS)
+    rent_df = rent_df.reindex(columns=attrs + [col for col in rent_df.columns if col not in attrs])
+    rent_df['Size'] = rent_df['Size'].astype(np.float64)
+    legacy = pd.Series(pack(rent_df.reindex(columns=AMENITY_ATTRS)), index=rent_df.index)
+    rent_df['Amenities'] = rent_df['Amenities'].fillna(legacy)
+    return rent_df
+
+def validate_listing(listing):
+    # Raise ValueError for a request body that cannot be scored
+    if not isinstance(listing, dict):
+        raise ValueError('Each listing must be a JSON object')
+    for attr in REQUIRED_ATTRS + OPTIONAL_ATTRS:
+        value = listing.get(attr)
+        if value is None and attr in OPTIONAL_ATTRS:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f'{attr!r} must be a number')
+    return listing
+
+
+class MicroBatcher:
+    """
+    Collects single-listing requests from many threads and scores them together,
+    waiting at most max_wait seconds to fill a batch of up to max_batch listings.
+    """
+
+    def __init__(self, predictor, max_batch=256, max_wait=0.002):
+        self.predictor = predictor
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._requests = queue.Queue()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(self, listing):
+        future = Future()
+        try:
+            validate_listing(listing)
+        except ValueError as e:
+            future.set_exception(e)
+            return future
+        self._requests.put((listing, future))
+        return future
+
+    def _next_batch(self):
+        batch = [self._requests.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._requests.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            listings = [listing for listing, _ in batch]
+            try:
+                results = self.predictor.score_listings(listings)
+            except Exception:
+                # Score one by one so a bad listing only fails its own request
+                self._run_each(batch)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def _run_each(self, batch):
+        for listing, future in batch:
+            try:
+                future.set_result(self.predictor.score_listings([listing])[0])
+            except Exception as e:
+                future.set_exception(e)
+
+
+def _make_handler(batcher):
+    class PredictHandler(BaseHTTPRequestHandler):
+        # POST /predict with one listing object or a list of them
+        def do_POST(self):
+            if self.path != '/predict':
+                self._send_json(404, {'error': 'Not found'})
+                return
+            try:
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            except (TypeError, ValueError):
+                self._send_json(400, {'error': 'Expected a JSON listing or list of listings'})
+                return
+            listings = body if isinstance(body, list) else [body]
+            futures = [batcher.submit(listing) for listing in listings]
+            result, errors = [], []
+            for i, future in enumerate(futures):
+                try:
+                    result.append(future.result())
+                except ValueError as e:
+                    errors.append((400, {'index': i, 'error': str(e)}))
+                except Exception as e:
+                    errors.append((500, {'index': i, 'error': repr(e)}))
+            if errors:
+                status = max(status for status, _ in errors)
+                self._send_json(status, {'errors': [error for _, error in errors]})
+                return
+            self._send_json(200, result if isinstance(body, list) else result[0])
+
+        def _send_json(self, status, obj):
+            payload = json.dumps(obj).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return PredictHandler
+
+def serve(predictor, host='127.0.0.1', port=8000, max_batch=256, max_wait=0.002):
+    batcher = MicroBatcher(predictor, max_batch=max_batch, max_wait=max_wait)
+    server = ThreadingHTTPServer((host, port), _make_handler(batcher))
+    print(f'Serving rent predictions on http://{host}:{port}/predict')
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    serve(RentPredictor.load())
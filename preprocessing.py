@@ -1,10 +1,14 @@
 from sklearn.base import BaseEstimator, TransformerMixin
 from sklearn.impute import KNNImputer
+from sklearn.neighbors import BallTree
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import StandardScaler, OneHotEncoder
 from sklearn.compose import ColumnTransformer
 import numpy as np
 import pandas as pd
+from amenities import expand
+from neighbourhoods import profile_table
+from instrumentation import instrument
 
 DUMMY_ATTRS = [
     'Balcony',
@@ -16,15 +20,16 @@ DUMMY_ATTRS = [
     'Concierge Service',
 ]
 
-NUM_ATTRS = [
+LISTING_ATTRS = [
     'lng',
     'lat',
     'Bedrooms',
     'Bathrooms',
     'Size',
-    'index_right',
-    'AREA_SHORT_CODE',
-    'AREA_NAME',
+]
+
+# Neighbourhood profile attributes, gathered by AREA_SHORT_CODE in ProfileJoiner
+PROFILE_ATTRS = [
     'Average Total Income',
     'Median Age',
     'Average Household Size',
@@ -44,24 +49,160 @@ NUM_ATTRS = [
     'No certificate, diploma or degree',
     'Secondary (high) school diploma or equivalent',
     'Postsecondary certificate, diploma or degree',
-    'geometry'
 ]
 
+NUM_ATTRS = LISTING_ATTRS + ['AREA_SHORT_CODE']
+
+# Attributes removed by FeatureDropper
+ID_ATTRS = ['AREA_SHORT_CODE']
+DWELLING_ATTRS = [
+    'Single-detached house %',
+    'Semi-detached house %',
+    'Row house %',
+    'Apartment or flat in a duplex %',
+    'Apartment in a building w/ < 5 stories %',
+]
+EDUCATION_ATTRS = [
+    'No certificate, diploma or degree',
+    'Secondary (high) school diploma or equivalent',
+]
+COMMUTE_ATTRS = [
+    'Car, truck, van - as a driver %',
+    'Car, truck, van - as a passenger %',
+]
+
+# Features to base imputation on
+IMPUTE_ATTRS = ['Size', 'Bedrooms', 'Bathrooms', 'lng', 'lat']
+
 class SizeImputer(KNNImputer):
     def __init__(self, n_neighbors=5):
-        # Features to base imputation on
-        self.cols = ['Size', 'Bedrooms', 'Bathrooms', 'lng', 'lat']
+        self.cols = IMPUTE_ATTRS
         super().__init__(n_neighbors=n_neighbors, copy=True)
 
     def fit(self, X, y=None):
         tr_X = X[self.cols]
         return super().fit(tr_X)
 
+    def partial_fit(self, X, y=None):
+        # Add new listings to the reference set that neighbours are drawn from
+        ref_X = pd.DataFrame(self._fit_X, columns=self.cols)
+        return self.fit(pd.concat([ref_X, X[self.cols]], ignore_index=True))
+
     def transform(self, X):
         tr_X = X[self.cols]
         X[['Size']] = super().transform(tr_X)[:, 0]
         return X
 
+class TreeSizeImputer(BaseEstimator, TransformerMixin):
+    # Drop-in replacement for SizeImputer that scales to millions of listings:
+    # 'Size' is the mean of the n_neighbors nearest listings (haversine distance)
+    # with the same number of bedrooms and bathrooms, found with one BallTree per
+    # (Bedrooms, Bathrooms) bucket instead of a brute-force nan-euclidean search.
+    def __init__(self, n_neighbors=5, chunk_size=100000):
+        self.n_neighbors = n_neighbors
+        self.chunk_size = chunk_size
+
+    @staticmethod
+    def _buckets(X):
+        return np.nan_to_num(X[['Bedrooms', 'Bathrooms']].to_numpy(dtype=np.float64), nan=-1)
+
+    @staticmethod
+    def _coords(X):
+        return np.radians(X[['lat', 'lng']].to_numpy(dtype=np.float64))
+
+    def fit(self, X, y=None):
+        known = (X['Size'].notna() & X['lat'].notna() & X['lng'].notna()).to_numpy()
+        self.reference_ = X.loc[known, IMPUTE_ATTRS].reset_index(drop=True)
+        sizes = X['Size'].to_numpy(dtype=np.float64)[known]
+        coords = self._coords(X)[known]
+        keys, inverse = np.unique(self._buckets(X)[known], axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+
+        self.trees_ = {}
+        for i, key in enumerate(map(tuple, keys)):
+            in_bucket = inverse == i
+            # Too few listings in a bucket to take n_neighbors from; use the global tree
+            if in_bucket.sum() >= self.n_neighbors:
+                self.trees_[key] = (BallTree(coords[in_bucket], metric='haversine'), sizes[in_bucket])
+        self.global_tree_ = (BallTree(coords, metric='haversine'), sizes)
+        self.mean_size_ = sizes.mean()
+        return self
+
+    def partial_fit(self, X, y=None):
+        # Add new listings to the reference set and rebuild the trees
+        return self.fit(pd.concat([self.reference_, X[IMPUTE_ATTRS]], ignore_index=True))
+
+    def _impute(self, tree, ref_sizes, coords):
+        k = min(self.n_neighbors, len(ref_sizes))
+        out = np.empty(len(coords))
+        # Query in chunks so the neighbour index arrays stay bounded
+        for start in range(0, len(coords), self.chunk_size):
+            _, ind = tree.query(coords[start:start + self.chunk_size], k=k)
+            out[start:start + self.chunk_size] = ref_sizes[ind].mean(axis=1)
+        return out
+
+    def transform(self, X):
+        sizes = X['Size'].to_numpy(dtype=np.float64, copy=True)
+        missing = np.flatnonzero(np.isnan(sizes))
+        if len(missing) == 0:
+            return X
+
+        coords = self._coords(X)[missing]
+        located = ~np.isnan(coords).any(axis=1)
+        sizes[missing[~located]] = self.mean_size_
+
+        missing, coords = missing[located], coords[located]
+        keys, inverse = np.unique(self._buckets(X)[missing], axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        for i, key in enumerate(map(tuple, keys)):
+            rows = inverse == i
+            tree, ref_sizes = self.trees_.get(key, self.global_tree_)
+            sizes[missing[rows]] = self._impute(tree, ref_sizes, coords[rows])
+        X['Size'] = sizes
+        return X
+
+class ProfileJoiner(BaseEstimator, TransformerMixin):
+    # Appends neighbourhood profile attributes to each listing. The data matrix only
+    # carries AREA_SHORT_CODE; the ~140-row profile table is copied in at fit time
+    # and gathered with one fancy index per transform.
+    def __init__(self, attrs=PROFILE_ATTRS, profiles=None):
+        self.attrs = attrs
+        self.profiles = profiles
+
+    def fit(self, X, y=None):
+        profiles = profile_table() if self.profiles is None else self.profiles
+        codes = profiles.index.to_numpy().astype(np.int64)
+        self.rows_ = np.full(codes.max() + 1, -1, dtype=np.int64)
+        self.rows_[codes] = np.arange(len(codes))
+        self.table_ = profiles[list(self.attrs)].to_numpy(dtype=np.float64)
+        return self
+
+    def gather(self, codes):
+        rows = self.rows_[np.asarray(codes).astype(np.int64)]
+        if (rows < 0).any():
+            raise ValueError('AREA_SHORT_CODE not in the neighbourhood profile table')
+        return self.table_[rows]
+
+    def transform(self, X):
+        profiles = pd.DataFrame(self.gather(X['AREA_SHORT_CODE']), columns=list(self.attrs), index=X.index)
+        return pd.concat([X, profiles], axis=1)
+
+class AmenityExpander(BaseEstimator, TransformerMixin):
+    # Expands the bit-packed 'Amenities' column into one 0/1 column per amenity
+    def __init__(self, amenities=DUMMY_ATTRS):
+        self.amenities = amenities
+
+    def fit(self, X, y=None):
+        return self
+
+    def transform(self, X):
+        return expand(X['Amenities'].to_numpy(), self.amenities)
+
+IMPUTERS = {
+    'knn': SizeImputer,
+    'tree': TreeSizeImputer,
+}
+
 class FeatureCombiner(BaseEstimator, TransformerMixin):
     def __init__(self, mul=True):
         self.multiply = mul
@@ -90,49 +231,120 @@ class FeatureDropper(BaseEstimator, TransformerMixin):
     def fit(self, X, y=None):
         return self
 
-    def transform(self, X):
-        X = X.drop(['index_right', 'AREA_SHORT_CODE', 'AREA_NAME', 'geometry'], axis=1)
+    def dropped_attrs(self):
+        dropped = []
         if self.dwellings:
-            X = X.drop([
-                'Single-detached house %',
-                'Semi-detached house %',
-                'Row house %',
-                'Apartment or flat in a duplex %',
-                'Apartment in a building w/ < 5 stories %',
-            ], axis=1)
+            dropped += DWELLING_ATTRS
         if self.education:
-            X = X.drop([
-                'No certificate, diploma or degree',
-                'Secondary (high) school diploma or equivalent',
-            ], axis=1)
+            dropped += EDUCATION_ATTRS
         if self.commute:
-            X = X.drop([
-                'Car, truck, van - as a driver %',
-                'Car, truck, van - as a passenger %',
-            ], axis=1)
+            dropped += COMMUTE_ATTRS
         if self.pvt_dwellings:
-            X = X.drop(['Total private dwellings'], axis=1)
+            dropped += ['Total private dwellings']
         if self.m_age:
-            X = X.drop(['Median Age'], axis=1)
-        return X
+            dropped += ['Median Age']
+        return dropped
+
+    def transform(self, X):
+        # Profile attributes that are dropped are usually never joined in the first place
+        return X.drop(X.columns.intersection(ID_ATTRS + self.dropped_attrs()), axis=1)
+
+def kept_profile_attrs(dropper):
+    dropped = set(dropper.dropped_attrs())
+    return [attr for attr in PROFILE_ATTRS if attr not in dropped]
 
-def pipeline(n_neighbors=5, mul=True):
+def pipeline(n_neighbors=5, mul=True, imputer='knn'):
+    feature_dropper = FeatureDropper(
+        dwellings=True,
+        education=True,
+        commute=True,
+        pvt_dwellings=True,
+        m_age=True
+    )
     num_pipeline = Pipeline([
-        ('size_imputer', SizeImputer(n_neighbors=n_neighbors)),
+        ('size_imputer', IMPUTERS[imputer](n_neighbors=n_neighbors)),
+        ('profile_joiner', ProfileJoiner(attrs=kept_profile_attrs(feature_dropper))),
         ('bed+bath_combiner', FeatureCombiner(mul=mul)),
-        ('feature_dropper', FeatureDropper(
-            dwellings=True,
-            education=True,
-            commute=True,
-            pvt_dwellings=True,
-            m_age=True
-        )),
+        ('feature_dropper', feature_dropper),
         ('std_scaler', StandardScaler())
     ])
 
     data_pipeline = ColumnTransformer([
         ('num', num_pipeline, NUM_ATTRS),
-        ('cat', 'passthrough', DUMMY_ATTRS)
+        ('cat', AmenityExpander(DUMMY_ATTRS), ['Amenities'])
     ])
 
-    return data_pipeline
+    return instrument(data_pipeline)
+
+
+class ArrayPipeline(BaseEstimator, TransformerMixin):
+    # Equivalent of pipeline() (with every FeatureDropper option on) that works on a
+    # single preallocated array. Column positions are fixed at construction, Size is
+    # imputed only for the rows missing it, and Bed*Bath and scaling are done in place.
+    def __init__(self, n_neighbors=5, mul=True, imputer='knn', dtype=np.float64):
+        self.n_neighbors = n_neighbors
+        self.mul = mul
+        self.imputer = imputer
+        self.dtype = dtype
+
+    @staticmethod
+    def _profile_cols():
+        return kept_profile_attrs(FeatureDropper(True, True, True, True, True))
+
+    def _fill(self, X):
+        # Layout: lng, lat, Size, kept profile attributes, Bedrooms (becomes Bed*Bath), then the dummies
+        n = len(X)
+        out = np.empty((n, self.n_scaled_ + len(DUMMY_ATTRS)), dtype=self.dtype)
+        for j, col in self.listing_cols_:
+            out[:, j] = X[col].to_numpy()
+        out[:, self.profile_slice_] = self.joiner_.gather(X['AREA_SHORT_CODE'].to_numpy())
+        expand(X['Amenities'].to_numpy(), DUMMY_ATTRS, out=out[:, self.n_scaled_:])
+
+        size = out[:, self.size_idx_]
+        missing = np.flatnonzero(np.isnan(size))
+        if len(missing):
+            sub = X[IMPUTE_ATTRS].iloc[missing].reset_index(drop=True)
+            size[missing] = self.imputer_.transform(sub)['Size'].to_numpy()
+
+        bath = X['Bathrooms'].to_numpy(dtype=self.dtype)
+        combined = out[:, self.bed_idx_]
+        if self.mul:
+            np.multiply(combined, bath, out=combined)
+        else:
+            np.add(combined, bath, out=combined)
+        return out
+
+    def fit(self, X, y=None):
+        self._fit(X)
+        return self
+
+    def _fit(self, X):
+        profile_cols = self._profile_cols()
+        self.listing_cols_ = [(0, 'lng'), (1, 'lat'), (2, 'Size'), (3 + len(profile_cols), 'Bedrooms')]
+        self.profile_slice_ = slice(3, 3 + len(profile_cols))
+        self.size_idx_ = 2
+        self.bed_idx_ = 3 + len(profile_cols)
+        self.n_scaled_ = self.bed_idx_ + 1
+
+        self.joiner_ = ProfileJoiner(attrs=profile_cols).fit(X)
+        self.imputer_ = IMPUTERS[self.imputer](n_neighbors=self.n_neighbors).fit(X[IMPUTE_ATTRS])
+        out = self._fill(X)
+
+        # Same statistics as StandardScaler: NaN-aware, population variance, zero scale -> 1
+        scaled = out[:, :self.n_scaled_].astype(np.float64)
+        self.mean_ = np.nanmean(scaled, axis=0)
+        self.scale_ = np.sqrt(np.nanvar(scaled, axis=0))
+        self.scale_[self.scale_ < 10 * np.finfo(np.float64).eps] = 1.0
+        return out
+
+    def _scale(self, out):
+        scaled = out[:, :self.n_scaled_]
+        scaled -= self.mean_.astype(self.dtype)
+        scaled /= self.scale_.astype(self.dtype)
+        return out
+
+    def transform(self, X):
+        return self._scale(self._fill(X))
+
+    def fit_transform(self, X, y=None):
+        return self._scale(self._fit(X))
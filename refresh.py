@@ -0,0 +1,134 @@
+import copy
+import os
+import pickle
+import sys
+from getopt import getopt
+
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.model_selection import train_test_split as split_holdout
+
+from data_loader import iter_data_matrix, load_data, train_test_split
+from instrumentation import unwrap
+from predictor import NGB_PATH, PREDICTOR_PATH, RentPredictor
+from preprocessing import NUM_ATTRS
+
+REFRESH_STAGES = 100 # Boosting stages appended per refresh
+
+# Full retrain once either metric crosses its threshold
+MAX_MEAN_SHIFT = 0.5 # Largest feature mean shift since the last full fit, in training standard deviations
+MAX_NLL_INCREASE = 0.25 # Increase of the mean NLL on new listings over the held-out NLL of the last full fit
+
+
+def _num_pipeline(predictor):
+    return predictor.data_pipeline.named_transformers_['num']
+
+def _step(num_pipeline, name):
+    return unwrap(num_pipeline.named_steps[name])
+
+def _unscaled(num_pipeline, X):
+    # Features as they reach the frozen scaler
+    return num_pipeline[:-1].transform(X[NUM_ATTRS].copy())
+
+def mean_nll(model, X, y):
+    return float(-np.mean(model.pred_dist(X).logpdf(np.asarray(y))))
+
+
+def init_state(predictor, X_holdout, y_holdout):
+    """
+    Drift reference for a predictor: running feature statistics that start
+    from the frozen scaler's, the held-out NLL at fit time, and the number of
+    boosting stages a full retrain uses.
+    """
+    return {
+        'running_scaler': copy.deepcopy(_step(_num_pipeline(predictor), 'std_scaler')),
+        'reference_nll': mean_nll(predictor.model, predictor.transform(X_holdout.copy()), y_holdout),
+        'n_estimators': predictor.model.n_estimators,
+        'n_refreshes': 0,
+    }
+
+def drift(predictor, state, X, y):
+    """
+    Update the running statistics with the new listings and return the drift
+    metrics. The model keeps seeing inputs standardized by the frozen scaler.
+    """
+    num_pipeline = _num_pipeline(predictor)
+    scaler = _step(num_pipeline, 'std_scaler')
+    state['running_scaler'].partial_fit(_unscaled(num_pipeline, X))
+    mean_shift = np.abs(state['running_scaler'].mean_ - scaler.mean_) / scaler.scale_
+    return {
+        'mean_shift': float(mean_shift.max()),
+        'nll_increase': mean_nll(predictor.model, predictor.transform(X.copy()), y) - state['reference_nll'],
+    }
+
+def retrain(predictor, X, y, test_prop=0.15, seed=69):
+    # Refit the pipeline and model from scratch with the same hyperparameters
+    state = getattr(predictor, 'refresh_state', None)
+    X_train, X_holdout, y_train, y_holdout = split_holdout(X, y, test_size=test_prop, random_state=seed)
+    data_pipeline = clone(predictor.data_pipeline)
+    model = clone(predictor.model)
+    if state is not None:
+        model.n_estimators = state['n_estimators']
+    model.fit(data_pipeline.fit_transform(X_train.copy()), np.asarray(y_train))
+    new_predictor = RentPredictor(data_pipeline, model, predictor.quantiles)
+    new_predictor.refresh_state = init_state(new_predictor, X_holdout, y_holdout)
+    return new_predictor
+
+def refresh(predictor, X, y, history=None, n_stages=REFRESH_STAGES,
+            max_mean_shift=MAX_MEAN_SHIFT, max_nll_increase=MAX_NLL_INCREASE):
+    """
+    Fold new listings (X, y) into a fitted RentPredictor without refitting on
+    the full history: the size imputer's reference set grows by the new rows
+    and n_stages boosting stages fitted on them are appended to the model. If
+    drift crosses a threshold, the predictor is retrained on history() + new
+    listings instead. Returns (predictor, metrics).
+    """
+    state = getattr(predictor, 'refresh_state', None)
+    if state is None:
+        split = train_test_split()
+        state = init_state(predictor, split['test']['data'], split['test']['labels'])
+
+    metrics = drift(predictor, state, X, y)
+    metrics['retrained'] = metrics['mean_shift'] > max_mean_shift or metrics['nll_increase'] > max_nll_increase
+    if metrics['retrained']:
+        if history is None:
+            raise ValueError('Drift threshold crossed and no history to retrain on')
+        X_old, y_old = history()
+        return retrain(predictor, pd.concat([X_old, X]), pd.concat([y_old, y])), metrics
+
+    _step(_num_pipeline(predictor), 'size_imputer').partial_fit(X)
+    model = predictor.model
+    # partial_fit appends model.n_estimators stages to the existing ensemble. It also
+    # refits init_params to the marginal of y, which would shift every earlier stage,
+    # so that step is skipped for the duration of the call
+    model.n_estimators = n_stages
+    model.fit_init_params_to_marginal = lambda Y, *args, **kwargs: None
+    try:
+        model.partial_fit(predictor.transform(X.copy()), np.asarray(y))
+    finally:
+        del model.fit_init_params_to_marginal
+        model.n_estimators = state['n_estimators']
+    state['n_refreshes'] += 1
+    predictor.refresh_state = state
+    return predictor, metrics
+
+def _history():
+    data_matrix = load_data()
+    return data_matrix.drop('Price', axis=1), data_matrix['Price']
+
+
+if __name__ == '__main__':
+    opts, args = getopt(sys.argv[1:], "p:s:")
+    opts = dict(opts)
+    if len(args) != 1:
+        # The full rent_data.csv is the training history, not new listings
+        sys.exit('usage: python refresh.py [-p predictor] [-s stages] new_listings.csv')
+    path = opts.get('-p', PREDICTOR_PATH)
+    new_data = pd.concat(list(iter_data_matrix(args[0])))
+    predictor, metrics = refresh(RentPredictor.load(path), new_data.drop('Price', axis=1), new_data['Price'],
+                                 history=_history, n_stages=int(opts.get('-s', REFRESH_STAGES)))
+    print(f'Refreshed on {len(new_data)} listings: {metrics}')
+    predictor.save(path)
+    with open(NGB_PATH, 'wb') as f:
+        pickle.dump(predictor.model, f)
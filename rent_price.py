@@ -0,0 +1,112 @@
+"""
+Command line entry point. Each subcommand imports what it needs when it runs,
+so `score` only loads NumPy and the exported scoring artifact.
+
+    python rent_price.py score listings.csv > scores.jsonl
+    python rent_price.py train --export
+    python rent_price.py export
+    python rent_price.py scrape -w 4
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+
+SCRAPER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scraper')
+
+
+def score(args):
+    from scoring import SCORING_PATH, Scorer
+
+    scorer = Scorer.load(args.artifact or SCORING_PATH)
+    with (open(args.input, newline='') if args.input != '-' else sys.stdin) as f:
+        listings = list(csv.DictReader(f))
+    out = open(args.output, 'w') if args.output != '-' else sys.stdout
+    try:
+        for start in range(0, len(listings), args.batch_size):
+            batch = listings[start:start + args.batch_size]
+            for result in scorer.score_listings(batch):
+                out.write(json.dumps(result) + '\n')
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+def train(args):
+    import numpy as np
+    from ngboost import NGBRegressor
+
+    from data_loader import train_test_split
+    from predictor import PREDICTOR_PATH, RentPredictor
+    from preprocessing import pipeline
+
+    rent = train_test_split()
+    data_pipeline = pipeline(n_neighbors=args.n_neighbors, mul=not args.add, imputer=args.imputer)
+    X_train = data_pipeline.fit_transform(rent['train']['data'])
+    model = NGBRegressor(n_estimators=args.n_estimators, learning_rate=args.learning_rate,
+                         verbose=False, random_state=69)
+    model.fit(X_train, rent['train']['labels'].to_numpy())
+    predictor = RentPredictor(data_pipeline, model)
+
+    X_test = predictor.transform(rent['test']['data'])
+    nll = -np.mean(model.pred_dist(X_test).logpdf(rent['test']['labels'].to_numpy()))
+    print(f'Test NLL: {nll:.4f}')
+    predictor.save(args.predictor or PREDICTOR_PATH)
+    if args.export:
+        export(args)
+
+def export(args):
+    from predictor import PREDICTOR_PATH, RentPredictor
+    from scoring import SCORING_PATH, export_scorer
+
+    export_scorer(RentPredictor.load(args.predictor or PREDICTOR_PATH), args.artifact or SCORING_PATH)
+    print(f'Exported scoring artifact to {args.artifact or SCORING_PATH}.')
+
+def scrape(args):
+    import runpy
+
+    # The scraper keeps its state files next to it and imports its sibling modules
+    os.chdir(SCRAPER_DIR)
+    sys.path.insert(0, SCRAPER_DIR)
+    sys.argv = ['scraper.py'] + args.scraper_args
+    runpy.run_path('scraper.py', run_name='__main__')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='rent-price', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    score_parser = commands.add_parser('score', help='Score listings from a rent_data.csv-style file')
+    score_parser.add_argument('input', nargs='?', default='-')
+    score_parser.add_argument('-o', '--output', default='-')
+    score_parser.add_argument('--artifact')
+    score_parser.add_argument('--batch-size', type=int, default=10000)
+    score_parser.set_defaults(func=score)
+
+    train_parser = commands.add_parser('train', help='Fit the preprocessing pipeline and NGBoost model')
+    train_parser.add_argument('--n-neighbors', type=int, default=5)
+    train_parser.add_argument('--add', action='store_true', help='Combine bedrooms and bathrooms by adding')
+    train_parser.add_argument('--imputer', choices=['knn', 'tree'], default='knn')
+    train_parser.add_argument('--n-estimators', type=int, default=500)
+    train_parser.add_argument('--learning-rate', type=float, default=0.01)
+    train_parser.add_argument('--predictor')
+    train_parser.add_argument('--artifact')
+    train_parser.add_argument('--export', action='store_true', help='Also export the scoring artifact')
+    train_parser.set_defaults(func=train)
+
+    export_parser = commands.add_parser('export', help='Export a saved predictor for NumPy-only scoring')
+    export_parser.add_argument('--predictor')
+    export_parser.add_argument('--artifact')
+    export_parser.set_defaults(func=export)
+
+    scrape_parser = commands.add_parser('scrape', help='Run the scraper (options are passed through)')
+    scrape_parser.add_argument('scraper_args', nargs=argparse.REMAINDER)
+    scrape_parser.set_defaults(func=scrape)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
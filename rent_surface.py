@@ -0,0 +1,122 @@
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_loader import prepare_listings
+from neighbourhoods import get_assigner
+from predictor import PREDICTOR_PATH, RentPredictor
+
+TILES_DIR = os.path.join("models", "tiles")
+TILE_SIZE = 256
+RESOLUTION = 0.001 # Grid spacing in degrees (~80m east-west, ~110m north-south)
+
+# Standard units the surface is evaluated for
+UNIT_PROFILES = {
+    'studio': {'Bedrooms': 0, 'Bathrooms': 1, 'Size': 450},
+    '1br_1ba': {'Bedrooms': 1, 'Bathrooms': 1, 'Size': 600},
+    '1br_den_1ba': {'Bedrooms': 1.5, 'Bathrooms': 1, 'Size': 700},
+    '2br_1ba': {'Bedrooms': 2, 'Bathrooms': 1, 'Size': 800},
+    '2br_2ba': {'Bedrooms': 2, 'Bathrooms': 2, 'Size': 900},
+    '3br_2ba': {'Bedrooms': 3, 'Bathrooms': 2, 'Size': 1150},
+}
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+class RentSurface:
+    """
+    Predicted rent mean and sigma on a regular lng/lat grid over Toronto, stored
+    as (2, TILE_SIZE, TILE_SIZE) float32 tiles per unit profile. Tiles live under
+    models/tiles/<predictor hash>/, so a new model artifact gets new tiles, and
+    each tile is computed the first time it is read.
+    """
+
+    def __init__(self, predictor_path=PREDICTOR_PATH, root=TILES_DIR,
+                 resolution=RESOLUTION, tile_size=TILE_SIZE):
+        self.predictor_path = predictor_path
+        self.dir = os.path.join(root, _file_hash(predictor_path))
+        self.resolution = resolution
+        self.tile_size = tile_size
+        self._predictor = None
+
+        bounds = np.array([geometry.bounds for geometry in get_assigner().geometries])
+        self.min_lng, self.min_lat = bounds[:, 0].min(), bounds[:, 1].min()
+        self.n_cols = int(np.ceil((bounds[:, 2].max() - self.min_lng) / resolution))
+        self.n_rows = int(np.ceil((bounds[:, 3].max() - self.min_lat) / resolution))
+        self.n_tiles_x = int(np.ceil(self.n_cols / tile_size))
+        self.n_tiles_y = int(np.ceil(self.n_rows / tile_size))
+
+    @property
+    def predictor(self):
+        if self._predictor is None:
+            self._predictor = RentPredictor.load(self.predictor_path)
+        return self._predictor
+
+    def _tile_path(self, profile, tx, ty):
+        return os.path.join(self.dir, profile, f'{ty}_{tx}.npy')
+
+    def _cell_centers(self, tx, ty):
+        cols = tx * self.tile_size + np.arange(self.tile_size)
+        rows = ty * self.tile_size + np.arange(self.tile_size)
+        lng = self.min_lng + (cols + 0.5) * self.resolution
+        lat = self.min_lat + (rows + 0.5) * self.resolution
+        lng, lat = np.meshgrid(lng, lat)
+        return lng.ravel(), lat.ravel()
+
+    def compute_tile(self, profile, tx, ty):
+        lng, lat = self._cell_centers(tx, ty)
+        tile = np.full((2, self.tile_size * self.tile_size), np.nan, dtype=np.float32)
+        inside = get_assigner().positions(lng, lat) >= 0
+        if inside.any():
+            unit = UNIT_PROFILES[profile]
+            n = int(inside.sum())
+            listings = pd.DataFrame({
+                'lng': lng[inside],
+                'lat': lat[inside],
+                'Bedrooms': np.full(n, unit['Bedrooms'], dtype=np.float64),
+                'Bathrooms': np.full(n, unit['Bathrooms'], dtype=np.float64),
+                'Size': np.full(n, unit['Size'], dtype=np.float64),
+                'Amenities': np.zeros(n, dtype=np.uint16),
+            })
+            preds = self.predictor.pred_dist_batch(prepare_listings(listings))
+            tile[0, inside] = preds['mean']
+            tile[1, inside] = preds['sigma']
+        return tile.reshape(2, self.tile_size, self.tile_size)
+
+    def tile(self, profile, tx, ty):
+        path = self._tile_path(profile, tx, ty)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = path + '.tmp.npy'
+            np.save(tmp_path, self.compute_tile(profile, tx, ty))
+            os.replace(tmp_path, path)
+        return np.load(path, mmap_mode='r')
+
+    def precompute(self, profiles=tuple(UNIT_PROFILES)):
+        for profile in profiles:
+            for ty in range(self.n_tiles_y):
+                for tx in range(self.n_tiles_x):
+                    self.tile(profile, tx, ty)
+            print(f'Finished rent surface for {profile}.')
+
+    def lookup(self, profile, lng, lat):
+        # (mean, sigma) of the grid cell containing (lng, lat); NaN outside Toronto
+        col = int((lng - self.min_lng) // self.resolution)
+        row = int((lat - self.min_lat) // self.resolution)
+        if not (0 <= col < self.n_cols and 0 <= row < self.n_rows):
+            return np.nan, np.nan
+        tile = self.tile(profile, col // self.tile_size, row // self.tile_size)
+        mean, sigma = tile[:, row % self.tile_size, col % self.tile_size]
+        return float(mean), float(sigma)
+
+
+if __name__ == '__main__':
+    RentSurface().precompute()
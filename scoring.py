@@ -0,0 +1,201 @@
+import json
+import os
+
+import numpy as np
+
+from amenities import AMENITY_ATTRS, AMENITY_DTYPE, expand, pack
+from compiled_model import CompiledModel
+
+# Only NumPy is needed to load and score with the exported artifact; the
+# export itself runs where the full training environment is installed
+SCORING_PATH = os.path.join("models", "scoring")
+KNN_CHUNK_SIZE = 1024 # Listings imputed at once; bounds the distance matrix
+
+
+def _polygon_arrays(geometries):
+    # Every ring of every neighbourhood as one vertex array; rings are tested
+    # together with the even-odd rule, which also handles holes and multipolygons
+    vertices, offsets, ring_poly = [], [0], []
+    for i, geometry in enumerate(geometries):
+        polygons = getattr(geometry, 'geoms', [geometry])
+        for polygon in polygons:
+            for ring in [polygon.exterior, *polygon.interiors]:
+                coords = np.asarray(ring.coords, dtype=np.float64)
+                vertices.append(coords)
+                offsets.append(offsets[-1] + len(coords))
+                ring_poly.append(i)
+    bounds = np.array([geometry.bounds for geometry in geometries], dtype=np.float64)
+    return np.concatenate(vertices), np.array(offsets), np.array(ring_poly), bounds
+
+def export_scorer(predictor, path=SCORING_PATH):
+    """
+    Write a fitted RentPredictor as NumPy arrays: the compiled model, the
+    fitted preprocessing parameters, the KNN imputer's reference listings and
+    the neighbourhood polygons.
+    """
+    from compiled_model import compile_model
+    from instrumentation import unwrap
+    from neighbourhoods import get_assigner
+    from preprocessing import SizeImputer
+
+    num = predictor.data_pipeline.named_transformers_['num']
+    imputer = unwrap(num.named_steps['size_imputer'])
+    joiner = unwrap(num.named_steps['profile_joiner'])
+    combiner = unwrap(num.named_steps['bed+bath_combiner'])
+    scaler = unwrap(num.named_steps['std_scaler'])
+    expander = unwrap(predictor.data_pipeline.named_transformers_['cat'])
+    if not isinstance(imputer, SizeImputer):
+        raise ValueError('The NumPy scorer only reproduces the KNN size imputer')
+
+    combined = 'Bed*Bath' if combiner.multiply else 'Bed+Bath'
+    expected = ['lng', 'lat', 'Size'] + list(joiner.attrs) + [combined]
+    if list(getattr(scaler, 'feature_names_in_', expected)) != expected:
+        raise ValueError(f'Unexpected feature layout: {list(scaler.feature_names_in_)}')
+
+    os.makedirs(path, exist_ok=True)
+    compile_model(predictor.model).save(os.path.join(path, 'model'))
+    assigner = get_assigner()
+    vertices, ring_offsets, ring_poly, poly_bounds = _polygon_arrays(assigner.geometries)
+    np.savez(
+        os.path.join(path, 'preprocessing.npz'),
+        imputer_ref=np.asarray(imputer._fit_X, dtype=np.float64),
+        profile_rows=joiner.rows_,
+        profile_table=joiner.table_,
+        scaler_mean=scaler.mean_,
+        scaler_scale=scaler.scale_,
+        vertices=vertices,
+        ring_offsets=ring_offsets,
+        ring_poly=ring_poly,
+        poly_bounds=poly_bounds,
+        poly_codes=assigner.codes,
+    )
+    meta = {
+        'imputer_cols': list(imputer.cols),
+        'n_neighbors': int(imputer.n_neighbors),
+        'mul': bool(combiner.multiply),
+        'amenities': list(expander.amenities),
+        'quantiles': predictor.quantiles.tolist(),
+        'z': predictor._z.tolist(),
+    }
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+
+class Scorer:
+    """
+    NumPy-only equivalent of RentPredictor.score_listings, loaded from an
+    export_scorer() directory. Meant for short-lived batch jobs where importing
+    pandas, geopandas and sklearn would dominate the run time.
+    """
+
+    def __init__(self, model, arrays, meta):
+        self.model = model
+        self.meta = meta
+        for name, array in arrays.items():
+            setattr(self, name, array)
+        self.quantiles = np.asarray(meta['quantiles'])
+        self.z = np.asarray(meta['z'])
+        ref = self.imputer_ref
+        self.donors = ref[~np.isnan(ref[:, meta['imputer_cols'].index('Size')])]
+        self.mean_size = np.nanmean(ref[:, meta['imputer_cols'].index('Size')])
+
+    @classmethod
+    def load(cls, path=SCORING_PATH):
+        with open(os.path.join(path, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        with np.load(os.path.join(path, 'preprocessing.npz')) as npz:
+            arrays = {name: npz[name] for name in npz.files}
+        return cls(CompiledModel.load(os.path.join(path, 'model')), arrays, meta)
+
+    def assign(self, lng, lat):
+        # AREA_SHORT_CODE of each point (NaN outside Toronto); first polygon wins like NeighbourhoodAssigner
+        codes = np.full(len(lng), np.nan)
+        for i, (min_lng, min_lat, max_lng, max_lat) in enumerate(self.poly_bounds):
+            cand = np.flatnonzero(np.isnan(codes) & (lng >= min_lng) & (lng <= max_lng)
+                                  & (lat >= min_lat) & (lat <= max_lat))
+            if len(cand) == 0:
+                continue
+            x, y = lng[cand], lat[cand]
+            inside = np.zeros(len(cand), dtype=bool)
+            for ring in np.flatnonzero(self.ring_poly == i):
+                xy = self.vertices[self.ring_offsets[ring]:self.ring_offsets[ring + 1]]
+                x0, y0, x1, y1 = xy[:-1, 0], xy[:-1, 1], xy[1:, 0], xy[1:, 1]
+                # Ray casting: count edges crossed by a ray from each point towards +lng
+                straddles = (y0[None, :] > y[:, None]) != (y1[None, :] > y[:, None])
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    x_cross = x0 + (y[:, None] - y0) * (x1 - x0) / (y1 - y0)
+                inside ^= (straddles & (x[:, None] < x_cross)).sum(axis=1) % 2 == 1
+            codes[cand[inside]] = self.poly_codes[i]
+        return codes
+
+    def impute_size(self, X):
+        # Same neighbours as sklearn's KNNImputer: nan-euclidean distance, uniform weights
+        cols = self.meta['imputer_cols']
+        size = X[:, cols.index('Size')]
+        missing = np.flatnonzero(np.isnan(size))
+        k = min(self.meta['n_neighbors'], len(self.donors))
+        for start in range(0, len(missing), KNN_CHUNK_SIZE):
+            rows = missing[start:start + KNN_CHUNK_SIZE]
+            diff = X[rows, None, :] - self.donors[None, :, :]
+            present = ~np.isnan(diff)
+            n_present = present.sum(axis=2)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                dist = np.where(present, diff, 0.) ** 2
+                dist = dist.sum(axis=2) * len(cols) / n_present
+            dist[n_present == 0] = np.nan
+            nearest = np.argpartition(np.nan_to_num(dist, nan=np.inf), k - 1, axis=1)[:, :k]
+            filled = self.donors[nearest, cols.index('Size')].mean(axis=1)
+            filled[np.isnan(dist).all(axis=1)] = self.mean_size
+            size[rows] = filled
+        return size
+
+    def features(self, listings):
+        # Model input for listings that are inside Toronto, and their positions in `listings`
+        column = lambda attr: np.array([np.nan if row.get(attr) in (None, '') else float(row[attr])
+                                        for row in listings], dtype=np.float64)
+        lng, lat = column('lng'), column('lat')
+        codes = self.assign(lng, lat)
+        kept = np.flatnonzero(~np.isnan(codes))
+
+        bathrooms = column('Bathrooms')[kept]
+        bathrooms[bathrooms == 11] = 1 # Parsing error: 11 -> 1, 21 -> 2
+        bathrooms[bathrooms == 21] = 2
+        bedrooms = column('Bedrooms')[kept]
+        by_attr = {'Size': column('Size')[kept], 'Bedrooms': bedrooms, 'Bathrooms': bathrooms,
+                   'lng': lng[kept], 'lat': lat[kept]}
+        size = self.impute_size(np.column_stack([by_attr[col] for col in self.meta['imputer_cols']]))
+
+        combined = bedrooms * bathrooms if self.meta['mul'] else bedrooms + bathrooms
+        profiles = self.profile_table[self.profile_rows[codes[kept].astype(np.int64)]]
+        scaled = np.column_stack([lng[kept], lat[kept], size, profiles, combined])
+        scaled = (scaled - self.scaler_mean) / self.scaler_scale
+        dummies = expand(self._amenity_codes(column, kept), self.meta['amenities'], dtype=np.float64)
+        return np.hstack([scaled, dummies]), kept
+
+    @staticmethod
+    def _amenity_codes(column, kept):
+        # Packed 'Amenities' where given, else packed from the per-amenity columns of older files
+        codes = column('Amenities')[kept]
+        legacy = pack({amenity: column(amenity)[kept] for amenity in AMENITY_ATTRS})
+        return np.where(np.isnan(codes), legacy, codes).astype(AMENITY_DTYPE)
+
+    def score_listings(self, listings):
+        """
+        Score raw listings (dicts in the rent_data.csv schema). Listings outside
+        the City of Toronto get None, as in RentPredictor.score_listings.
+        """
+        results = [None] * len(listings)
+        if not listings:
+            return results
+        X, kept = self.features(listings)
+        if len(kept) == 0:
+            return results
+        dist = self.model.pred_dist(X)
+        for i, pos in enumerate(kept):
+            mean, sigma = float(dist.loc[i]), float(dist.scale[i])
+            results[pos] = {
+                'mean': mean,
+                'sigma': sigma,
+                'quantiles': dict(zip(self.quantiles.tolist(), (mean + sigma * self.z).tolist()))
+            }
+        return results
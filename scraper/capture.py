@@ -0,0 +1,133 @@
+import glob
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from getopt import getopt
+
+from dedup import DedupIndex
+from listing_parser import parse_listing, listing_rows
+
+CAPTURE_DIR = 'captures'
+CAPTURE_BATCH_SIZE = 200
+
+
+class CaptureWriter:
+    """
+    Saves raw listing pages (and optionally the intercepted network responses)
+    as gzipped JSON-lines batches under `root`, so parsing can happen offline
+    and be re-run over old captures. A batch file only appears once complete.
+    """
+
+    def __init__(self, root=CAPTURE_DIR, batch_size=CAPTURE_BATCH_SIZE):
+        self.root = root
+        self.batch_size = batch_size
+        self.buffer = []
+        self.n_batches = 0
+        self.lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def add(self, url, html, network=None):
+        record = {'url': url, 'fetched_at': time.time(), 'html': html}
+        if network is not None:
+            record['network'] = network
+        with self.lock:
+            self.buffer.append(record)
+            if len(self.buffer) >= self.batch_size:
+                self._flush()
+
+    def _flush(self):
+        if not self.buffer:
+            return
+        path = os.path.join(self.root, f'batch-{int(time.time() * 1000)}-{os.getpid()}-{self.n_batches:05d}.jsonl.gz')
+        tmp_path = path + '.tmp'
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            for record in self.buffer:
+                f.write(json.dumps(record) + '\n')
+        os.replace(tmp_path, path)
+        self.buffer = []
+        self.n_batches += 1
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def close(self):
+        self.flush()
+
+
+def capture_paths(root=CAPTURE_DIR):
+    # Batch files in capture order
+    return sorted(glob.glob(os.path.join(root, 'batch-*.jsonl.gz')))
+
+def iter_captures(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            yield json.loads(line)
+
+def parse_batch(path):
+    # Parsed listings of one batch file; pages that no longer parse are reported and skipped
+    listings = []
+    for record in iter_captures(path):
+        try:
+            listing = parse_listing(record['html'])
+        except Exception as e:
+            print(f'<< Could not parse capture of {record["url"]}: {e!r}')
+            continue
+        listing['canonical'] = listing['canonical'] or record['url']
+        listing['fetched_at'] = record['fetched_at']
+        listings.append(listing)
+    return listings
+
+def replay(store, geocode_cache, paths=None, n_workers=None):
+    """
+    Rebuild the rows of `store` from captured pages: batches are parsed in
+    parallel across processes, the latest capture of each canonical url wins,
+    addresses are geocoded in one cached batch, and near-duplicate units are
+    flagged in the store. Returns the number of listings.
+    """
+    paths = capture_paths() if paths is None else paths
+    latest = {}
+    with ProcessPoolExecutor(n_workers) as pool:
+        for listings in pool.map(parse_batch, paths):
+            for listing in listings:
+                previous = latest.get(listing['canonical'])
+                if previous is None or previous['fetched_at'] <= listing['fetched_at']:
+                    latest[listing['canonical']] = listing
+
+    listings = [listing for listing in latest.values() if listing['address'] and listing['rooms']]
+    coordinates = geocode_cache.get_many([listing['address'] for listing in listings])
+    store.clear_rows()
+    dedup_index = DedupIndex()
+    n_flagged = 0
+    for listing, coords in zip(listings, coordinates):
+        if coords is None:
+            continue
+        store.add(listing['canonical'])
+        n_flagged += dedup_index.write(store, listing_rows(listing, coords))
+    store.commit()
+    if n_flagged:
+        print(f'<< Flagged {n_flagged} near-duplicate rows.')
+    return len(listings)
+
+
+if __name__ == '__main__':
+    from geocoder import get_coordinates
+    from geocache import GeocodeCache
+    from store import ListingStore
+
+    opts, args = getopt(sys.argv[1:], "d:s:w:")
+    opts = dict(opts)
+    store = ListingStore(opts.get('-s', 'replayed.sqlite'), legacy_path=None, legacy_rows_path=None)
+    geocode_cache = GeocodeCache(get_coordinates)
+    try:
+        n_workers = int(opts['-w']) if '-w' in opts else None
+        n = replay(store, geocode_cache, capture_paths(opts.get('-d', CAPTURE_DIR)), n_workers)
+        store.export_csv('rent_data.csv')
+        print(f'Replayed {n} captured listings.')
+    finally:
+        store.close()
+        geocode_cache.close()
@@ -0,0 +1,129 @@
+import csv
+import sys
+import threading
+
+GEOHASH_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 7 # Cells of about 150m x 150m
+PRICE_REL_TOL = 0.01
+PRICE_ABS_TOL = 10
+
+
+def geohash(lat, lng, precision=GEOHASH_PRECISION):
+    lat_range, lng_range = [-90., 90.], [-180., 180.]
+    chars = []
+    bits, n_bits, even = 0, 0, True
+    while len(chars) < precision:
+        interval, value = (lng_range, lng) if even else (lat_range, lat)
+        mid = (interval[0] + interval[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            interval[0] = mid
+        else:
+            interval[1] = mid
+        even = not even
+        n_bits += 1
+        if n_bits == 5:
+            chars.append(GEOHASH_BASE32[bits])
+            bits, n_bits = 0, 0
+    return ''.join(chars)
+
+
+class DedupIndex:
+    """
+    Flags listings that are probably a unit already scraped under another url:
+    same geohash cell, same Bedrooms, Bathrooms and Size, and a price within
+    tolerance. Rows without a Size only match rows at the exact same
+    coordinates, since floorplans of one building often differ only in size.
+    Each check only looks at the few rows in its bucket, so a whole history
+    is indexed in linear time.
+    """
+
+    def __init__(self, precision=GEOHASH_PRECISION, rel_tol=PRICE_REL_TOL, abs_tol=PRICE_ABS_TOL):
+        self.precision = precision
+        self.rel_tol = rel_tol
+        self.abs_tol = abs_tol
+        self.buckets = {}
+        self.n_rows = 0
+        self.lock = threading.Lock()
+
+    def _unit(self, row):
+        return (row.get('Bedrooms'), row.get('Bathrooms'), row.get('Size'))
+
+    def _key(self, row):
+        return (geohash(row['lat'], row['lng'], self.precision), self._unit(row))
+
+    def _located(self, row):
+        return row.get('lat') is not None and row.get('lng') is not None
+
+    def find(self, row):
+        # Id of an indexed row this one duplicates, or None
+        if not self._located(row) or row.get('Price') is None:
+            return None
+        unit = self._unit(row)
+        price = row['Price']
+        tol = max(self.abs_tol, self.rel_tol * price)
+        coords = (row['lat'], row['lng'])
+        with self.lock:
+            for row_id, other, other_coords in self.buckets.get(self._key(row), ()):
+                if row.get('Size') is None and other_coords != coords:
+                    continue
+                if abs(other - price) <= tol:
+                    return row_id
+        return None
+
+    def add(self, row, row_id=None):
+        with self.lock:
+            row_id = self.n_rows if row_id is None else row_id
+            self.n_rows += 1
+            if self._located(row) and row.get('Price') is not None:
+                self.buckets.setdefault(self._key(row), []).append((row_id, row['Price'], (row['lat'], row['lng'])))
+            return row_id
+
+    def clear(self):
+        with self.lock:
+            self.buckets = {}
+            self.n_rows = 0
+
+    def write(self, store, rows):
+        """
+        Write the rows of one listing to `store`, each flagged with the id of
+        the indexed row it duplicates (or None), and index the unflagged ones
+        under their store ids. Rows are only compared with earlier listings,
+        since the floorplans of one listing can look alike. Returns the number
+        of flagged rows.
+        """
+        duplicate_of = [self.find(row) for row in rows]
+        row_ids = store.write_rows(rows, duplicate_of)
+        for row, row_id, original in zip(rows, row_ids, duplicate_of):
+            if original is None:
+                self.add(row, row_id)
+        return sum(original is not None for original in duplicate_of)
+
+
+def find_duplicates(rows, index=None):
+    # (row number, row number it duplicates) over a whole history, in one pass;
+    # row numbers of rent_data.csv are the data matrix index labels
+    index = index if index is not None else DedupIndex()
+    duplicates = []
+    for i, row in enumerate(rows):
+        original = index.find(row)
+        if original is not None:
+            duplicates.append((i, original))
+        index.add(row, i)
+    return duplicates
+
+def _read_rows(path):
+    with open(path, 'r', newline='') as f:
+        for row in csv.DictReader(f):
+            yield {k: float(v) if v not in ('', None) else None for k, v in row.items()}
+
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else 'rent_data.csv'
+    duplicates = find_duplicates(_read_rows(path))
+    with open('duplicates.csv', 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['row', 'duplicate_of'])
+        writer.writerows(duplicates)
+    print(f'Found {len(duplicates)} near-duplicate rows in {path}.')
@@ -0,0 +1,123 @@
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from re import sub
+
+GEOCODE_CACHE_PATH = 'geocode_cache.sqlite'
+GEOCODE_TTL = 90 * 24 * 3600 # Seconds before a cached address is geocoded again
+ABBREVIATIONS = {
+    'street': 'st',
+    'avenue': 'ave',
+    'road': 'rd',
+    'drive': 'dr',
+    'boulevard': 'blvd',
+    'crescent': 'cres',
+    'court': 'crt',
+    'place': 'pl',
+    'square': 'sq',
+    'west': 'w',
+    'east': 'e',
+    'north': 'n',
+    'south': 's',
+    'ontario': 'on',
+}
+
+
+def normalize_address(address):
+    # Key under which spellings of the same building address collide
+    address = address.lower()
+    address = sub(r'^(unit|suite|apt)?\s*#?\s*\d+[a-z]?\s*-\s*(?=\d)', '', address) # Drop unit prefix: "1203 - 12 King St"
+    address = sub(r'[^\w\s]', ' ', address)
+    words = [ABBREVIATIONS.get(word, word) for word in address.split()]
+    return ' '.join(words)
+
+
+class GeocodeCache:
+    """
+    Memoizes a geocode(address) -> {'lng': ..., 'lat': ...} function in SQLite.
+    Lookups of the same normalized address that are in flight at the same time
+    share a single call to the geocoder.
+    """
+
+    def __init__(self, geocode, path=GEOCODE_CACHE_PATH, ttl=GEOCODE_TTL):
+        self.geocode = geocode
+        self.ttl = ttl
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS geocodes (key TEXT PRIMARY KEY, result TEXT, fetched_at REAL)')
+        self.conn.commit()
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, keys):
+        found = {}
+        oldest = time.time() - self.ttl
+        keys = list(keys)
+        # Stay under SQLite's bound parameter limit
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            with self.lock:
+                rows = self.conn.execute(
+                    f'SELECT key, result FROM geocodes WHERE fetched_at >= ? AND key IN ({",".join("?" * len(chunk))})',
+                    [oldest] + chunk).fetchall()
+            found.update((key, json.loads(result)) for key, result in rows)
+        return found
+
+    def _store(self, key, result):
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO geocodes VALUES (?, ?, ?)', (key, json.dumps(result), time.time()))
+            self.conn.commit()
+
+    def get(self, address):
+        key = normalize_address(address)
+        cached = self._lookup([key])
+        if key in cached:
+            self.hits += 1
+            return cached[key]
+
+        with self.lock:
+            future = self.in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self.in_flight[key] = Future()
+        if not owner:
+            self.hits += 1
+            return future.result()
+
+        self.misses += 1
+        try:
+            result = self.geocode(address)
+            if result is not None:
+                self._store(key, result)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+
+    def get_many(self, addresses, n_workers=1):
+        """
+        Geocode a batch of addresses: cached keys come from one query, and each
+        distinct uncached address is geocoded once. Results follow input order.
+        """
+        keys = [normalize_address(address) for address in addresses]
+        results = self._lookup(set(keys))
+        self.hits += sum(key in results for key in keys)
+
+        to_fetch = {}
+        for key, address in zip(keys, addresses):
+            if key not in results:
+                to_fetch.setdefault(key, address)
+        with ThreadPoolExecutor(n_workers) as pool:
+            for key, result in zip(to_fetch, pool.map(self.get, to_fetch.values())):
+                results[key] = result
+        return [results[key] for key in keys]
+
+    def close(self):
+        self.conn.close()
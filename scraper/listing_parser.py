@@ -0,0 +1,224 @@
+from html.parser import HTMLParser
+from re import sub, search
+
+# Each amenity is one bit of the packed 'Amenities' column; keep the order in
+# sync with amenities.AMENITY_ATTRS used by the loader
+AMENITIES = [
+    'Balcony',
+    'Dishwasher',
+    'In Unit Laundry',
+    'On Site Laundry',
+    'Assigned Parking',
+    'Fitness Center',
+    'Garage Parking',
+    'Storage',
+    'Concierge Service',
+    'Swimming Pool'
+]
+AMENITY_BITS = {amenity: 1 << i for i, amenity in enumerate(AMENITIES)}
+ATTRS = ['lng',
+         'lat',
+         'Bedrooms',
+         'Bathrooms',
+         'Size',
+         'Amenities',
+         'Price'
+]
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+
+
+def parse_to_int(attr_str, sqft=False):
+    if sqft and attr_str == '—':
+        return None
+    try:
+        if search('K', attr_str) is not None:
+            return float(sub(r'[^\d.]', '', attr_str))*1000
+        return int(sub(r'[^\d.]', '', attr_str))
+    except ValueError:
+        print(f'Found an unparseable attribute string: {attr_str}, sqft={sqft}')
+        return None
+
+def parse_bedrooms(bedroom_str, floorplan_title):
+    if bedroom_str == "Studios":
+        num_beds = 0
+    else:
+        num_beds = int(bedroom_str[0])
+    # Check if listing has a den
+    match = search(r'.+\s[dD]en.*', floorplan_title)
+    if match is not None:
+        num_beds += 0.5
+    return num_beds
+
+def parse_single_bedrooms(bedroom_str):
+    if search('STUDIO(S{0,1})|Studio(s{0,1})|Bachelor|ROOM', bedroom_str) is not None:
+        return 0
+    return parse_to_int(bedroom_str)
+
+
+class Node:
+    # Minimal DOM node so saved pages can be queried by class name like the live driver
+    __slots__ = ('tag', 'attrs', 'children')
+
+    def __init__(self, tag, attrs):
+        self.tag = tag
+        self.attrs = dict(attrs)
+        self.children = []
+
+    def has_class(self, cls):
+        return cls in (self.attrs.get('class') or '').split()
+
+    def iter(self):
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed([c for c in node.children if isinstance(c, Node)]))
+
+    def find_all(self, cls=None, tag=None):
+        return [node for node in self.iter()
+                if (cls is None or node.has_class(cls)) and (tag is None or node.tag == tag)]
+
+    def find(self, cls=None, tag=None):
+        for node in self.iter():
+            if (cls is None or node.has_class(cls)) and (tag is None or node.tag == tag):
+                return node
+        return None
+
+    @property
+    def text(self):
+        parts = []
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, str):
+                parts.append(node)
+            else:
+                stack.extend(reversed(node.children))
+        return ' '.join(''.join(parts).split())
+
+
+class _TreeBuilder(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Node('document', [])
+        self.stack = [self.root]
+
+    def handle_starttag(self, tag, attrs):
+        node = Node(tag, attrs)
+        self.stack[-1].children.append(node)
+        if tag not in VOID_TAGS:
+            self.stack.append(node)
+
+    def handle_startendtag(self, tag, attrs):
+        self.stack[-1].children.append(Node(tag, attrs))
+
+    def handle_endtag(self, tag):
+        for i in range(len(self.stack) - 1, 0, -1):
+            if self.stack[i].tag == tag:
+                del self.stack[i:]
+                break
+
+    def handle_data(self, data):
+        self.stack[-1].children.append(data)
+
+def parse_html(html):
+    builder = _TreeBuilder()
+    builder.feed(html)
+    builder.close()
+    return builder.root
+
+
+def _canonical_url(doc):
+    for link in doc.find_all(tag='link'):
+        if link.attrs.get('rel') == 'canonical':
+            return link.attrs.get('href')
+    return None
+
+def _address(doc):
+    info_tbl = doc.find('SummaryTable_summaryTable__3zCmu')
+    if info_tbl is None:
+        return None
+    rows = info_tbl.find_all(tag='li')
+    if len(rows) < 3:
+        return None
+    cell = rows[-3].find(tag='div')
+    return cell.text if cell is not None else None
+
+def pack_amenities(amenity_texts):
+    mask = 0
+    for text in amenity_texts:
+        mask |= AMENITY_BITS.get(text, 0)
+    return mask
+
+def _amenities(doc):
+    return pack_amenities(
+        amenity.text
+        for panel in doc.find_all('Amenities_amenities__w0bR_')
+        for amenity in panel.find_all('Amenities_text__3STBF'))
+
+def _multiple_rooms(doc):
+    rooms = []
+    for room_type in doc.find_all('Floorplan_floorplansContainer__2Rtwg'):
+        room_comp = room_type.find_all('Floorplan_specLabel__1ZbKH')
+        room_price = room_type.find('Floorplan_floorplanPrice__230Qt')
+        title = room_type.find('Floorplan_title__179XB')
+        floorplan_title = room_type.find('Floorplan_floorplanTitle__3iB55')
+        # Floorplans that were not expanded when the page was saved have no specs
+        if len(room_comp) < 2 or room_price is None or title is None:
+            continue
+        rooms.append({
+            'Bedrooms': parse_bedrooms(title.text, floorplan_title.text if floorplan_title else ''),
+            'Bathrooms': parse_to_int(room_comp[1].text),
+            'Size': parse_to_int(room_comp[0].text, sqft=True),
+            'Price': parse_to_int(room_price.text)
+        })
+    return rooms
+
+def _single_room(doc):
+    panel = doc.find('BubbleDetail_listingAmenities__37Cvp')
+    price = doc.find('BubbleDetail_colPrice__2mVzj')
+    if panel is None or price is None:
+        return []
+    room_comp = panel.find_all('BubbleDetail_imageText__33oD_')
+    if len(room_comp) < 5:
+        return []
+    return [{
+        'Bedrooms': parse_single_bedrooms(room_comp[0].text),
+        'Bathrooms': parse_to_int(room_comp[1].text),
+        'Size': parse_to_int(room_comp[4].text, sqft=True),
+        'Price': parse_to_int(price.text)
+    }]
+
+def parse_listing(html):
+    """
+    Parse a saved listing page into the same fields the live scraper reads:
+    canonical url, address, packed amenity bits and one entry per floorplan.
+    """
+    doc = parse_html(html)
+    return {
+        'canonical': _canonical_url(doc),
+        'address': _address(doc),
+        'amenities': _amenities(doc),
+        'rooms': _multiple_rooms(doc) or _single_room(doc)
+    }
+
+def listing_rows(listing, coordinates):
+    # Flatten a parsed listing into rent_data.csv rows
+    rows = []
+    for room in listing['rooms']:
+        row = {'Amenities': listing['amenities']}
+        row.update(coordinates)
+        row.update(room)
+        rows.append(row)
+    return rows
+
+def listing_urls(html, base_url=''):
+    # Listing links on a saved list-view page
+    doc = parse_html(html)
+    urls = []
+    for item in doc.find_all('ListItem_listItem__1dHWi'):
+        link = item if item.tag == 'a' else item.find(tag='a')
+        href = link.attrs.get('href') if link is not None else None
+        if href:
+            urls.append(href if 'http' in href else base_url + href)
+    return urls
@@ -0,0 +1,80 @@
+import json
+import math
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+# Same switch as the training-side instrumentation: a JSON-lines file to append to
+METRICS_ENV = 'RENT_METRICS'
+
+_NULL_TIMER = nullcontext()
+
+
+class Histogram:
+    # Latency histogram with power-of-two millisecond buckets
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.
+        self.max = 0.
+
+    def observe(self, seconds):
+        ms = seconds * 1000
+        bucket = 0 if ms < 1 else 2 ** math.ceil(math.log2(ms))
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'mean_seconds': self.total / self.count if self.count else None,
+            'max_seconds': self.max,
+            'buckets_ms': {str(k): v for k, v in sorted(self.buckets.items())}
+        }
+
+
+class _Timer:
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+
+
+class ScrapeMetrics:
+    """
+    Per-listing latency histograms (page load, geocode, parse, write). When
+    RENT_METRICS is unset, timer() returns a shared no-op context manager.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.environ.get(METRICS_ENV)
+        self.enabled = bool(self.path)
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def timer(self, name):
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def observe(self, name, seconds):
+        with self.lock:
+            self.histograms.setdefault(name, Histogram()).observe(seconds)
+
+    def flush(self):
+        if not self.enabled:
+            return
+        with self.lock, open(self.path, 'a') as f:
+            for name, histogram in self.histograms.items():
+                event = dict(histogram.to_dict(), kind='histogram', name=name, ts=time.time(), pid=os.getpid())
+                f.write(json.dumps(event) + '\n')
@@ -0,0 +1,217 @@
+import os
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from urllib.request import Request, urlopen
+
+from listing_parser import parse_listing, listing_rows
+from metrics import ScrapeMetrics
+
+FLOORPLAN_CONTAINER = 'Floorplan_floorplansContainer__2Rtwg'
+FLOORPLAN_PANEL = 'Floorplan_floorplanPanel__25nE5'
+FLOORPLAN_SPEC = 'Floorplan_specLabel__1ZbKH'
+
+
+class TokenBucket:
+    """
+    Rate limiter shared by every worker: at most `rate` fetches per second on
+    average with bursts of up to `capacity`, however many workers are running.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class SeenSet:
+    # Thread-safe set of canonical urls; add() is True only for the first caller
+    def __init__(self, seen=()):
+        self.seen = set(seen)
+        self.lock = threading.Lock()
+
+    def add(self, key):
+        with self.lock:
+            if key in self.seen:
+                return False
+            self.seen.add(key)
+            return True
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.seen
+
+    def __len__(self):
+        return len(self.seen)
+
+
+class HttpFetcher:
+    # Plain HTTP fetcher for pages whose listing data is in the served HTML
+    def __init__(self, timeout=30, user_agent='Mozilla/5.0'):
+        self.timeout = timeout
+        self.headers = {'User-Agent': user_agent}
+
+    def fetch(self, url):
+        with urlopen(Request(url, headers=self.headers), timeout=self.timeout) as response:
+            return response.read().decode(response.headers.get_content_charset() or 'utf-8')
+
+    def close(self):
+        pass
+
+
+def expand_floorplans(driver, timeout=2, poll=0.1):
+    """
+    Open every collapsed Floorplan panel of the current page and wait until its
+    specs are rendered, so page_source has the rows of multi-floorplan listings.
+    """
+    containers = driver.find_elements_by_class_name(FLOORPLAN_CONTAINER)
+    for container in containers:
+        if container.find_elements_by_class_name(FLOORPLAN_SPEC):
+            continue
+        for panel in container.find_elements_by_class_name(FLOORPLAN_PANEL):
+            driver.execute_script("arguments[0].click();", panel)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if all(container.find_elements_by_class_name(FLOORPLAN_SPEC) for container in containers):
+            return True
+        time.sleep(poll)
+    return False
+
+
+class BrowserFetcher:
+    # One headless browser per worker for pages that need JavaScript to render
+    def __init__(self, make_driver):
+        self.driver = make_driver()
+
+    def fetch(self, url):
+        self.driver.get(url)
+        if not expand_floorplans(self.driver):
+            # A collapsed page has no floorplan rows; fail it so it is retried
+            raise TimeoutError('Floorplan panels did not expand')
+        return self.driver.page_source
+
+    def close(self):
+        self.driver.quit()
+
+
+def _worker(urls, make_fetcher, limiter, seen, geocode, sink, errors, metrics):
+    fetcher = make_fetcher()
+    try:
+        for url in urls:
+            if url in seen:
+                continue
+            limiter.acquire()
+            try:
+                with metrics.timer('page_load'):
+                    html = fetcher.fetch(url)
+                with metrics.timer('parse'):
+                    listing = parse_listing(html)
+                canonical = listing['canonical'] or url
+                if canonical in seen:
+                    continue
+                if not listing['rooms']:
+                    raise ValueError('no floorplan rows on the page')
+                with metrics.timer('geocode'):
+                    coordinates = geocode(listing['address'])
+                rows = listing_rows(listing, coordinates)
+                with metrics.timer('write'):
+                    sink(rows)
+            except Exception as e:
+                print(f'<< Could not retrieve listing {url}: {e!r}')
+                errors.append(url)
+                continue
+            # Only listings whose rows were written count as seen, so failures are retried
+            seen.add(canonical)
+    finally:
+        fetcher.close()
+
+def _capture_worker(urls, make_fetcher, limiter, seen, capture, errors, metrics):
+    fetcher = make_fetcher()
+    try:
+        for url in urls:
+            if url in seen:
+                continue
+            limiter.acquire()
+            try:
+                with metrics.timer('page_load'):
+                    html = fetcher.fetch(url)
+            except Exception as e:
+                print(f'<< Could not retrieve listing {url}: {e!r}')
+                errors.append(url)
+                continue
+            with metrics.timer('capture'):
+                capture.add(url, html)
+            seen.add(url)
+    finally:
+        fetcher.close()
+
+def _run_workers(target, urls, n_workers, *args):
+    threads = [
+        threading.Thread(target=target, args=(urls[i::n_workers],) + args, daemon=True)
+        for i in range(n_workers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+def scrape_pool(urls, write_rows, geocode, n_workers=4, rate=0.5, burst=1,
+                make_fetcher=HttpFetcher, seen=None, metrics=None):
+    """
+    Scrape `urls` with n_workers threads, each with its own fetcher and a
+    disjoint slice of the urls. Politeness is set by the shared token bucket
+    (rate fetches/sec), so adding workers only hides per-page latency.
+    Returns the urls that failed.
+    """
+    limiter = TokenBucket(rate, burst)
+    seen = seen if seen is not None else SeenSet()
+    metrics = metrics if metrics is not None else ScrapeMetrics()
+    write_lock = threading.Lock()
+    errors = []
+
+    def sink(rows):
+        with write_lock:
+            write_rows(rows)
+
+    _run_workers(_worker, urls, n_workers, make_fetcher, limiter, seen, geocode, sink, errors, metrics)
+    return errors
+
+def capture_pool(urls, capture, n_workers=4, rate=0.5, burst=1,
+                 make_fetcher=HttpFetcher, seen=None, metrics=None):
+    """
+    Like scrape_pool, but only saves each page to `capture` (a CaptureWriter)
+    for capture.replay to parse later. Returns the urls that failed.
+    """
+    limiter = TokenBucket(rate, burst)
+    seen = seen if seen is not None else SeenSet()
+    metrics = metrics if metrics is not None else ScrapeMetrics()
+    errors = []
+    _run_workers(_capture_worker, urls, n_workers, make_fetcher, limiter, seen, capture, errors, metrics)
+    capture.flush()
+    return errors
+
+
+def serve_fixtures(directory, host='127.0.0.1', port=0):
+    """
+    Serve saved pages from `directory` on a background thread so the pool can be
+    exercised locally. Returns the server and its base url.
+    """
+    handler = partial(SimpleHTTPRequestHandler, directory=os.fspath(directory))
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://{host}:{server.server_address[1]}/'
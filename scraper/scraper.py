@@ -12,7 +12,6 @@ from re import sub, search
 from urllib.parse import urlparse, parse_qs
 import json
 import pdb
-from copy import deepcopy
 
 import selenium
 from selenium import webdriver, common
@@ -26,39 +25,19 @@ from selenium.common.exceptions import ElementClickInterceptedException, Timeout
      NoSuchElementException, ElementNotInteractableException, StaleElementReferenceException
 from geocoder import get_coordinates
 from notifier import send_message, notify_error
+from listing_parser import ATTRS, pack_amenities, parse_to_int, parse_bedrooms, parse_single_bedrooms, listing_urls
+from geocache import GeocodeCache
+from pool import BrowserFetcher, capture_pool, expand_floorplans, scrape_pool
+from store import ListingStore
+from metrics import ScrapeMetrics
+from capture import CaptureWriter
+from dedup import DedupIndex
 
 
 BASE_URL = 'https://www.padmapper.com/apartments/toronto-on?exclude-airbnb'
 MAX_LISTINGS = 7400
-AMENITIES = {
-    'Balcony': 0,
-    'Dishwasher': 0,
-    'In Unit Laundry': 0,
-    'On Site Laundry': 0,
-    'Assigned Parking': 0,
-    'Fitness Center': 0,
-    'Garage Parking': 0,
-    'Storage': 0,
-    'Concierge Service': 0,
-    'Swimming Pool': 0
-}
-ATTRS = ['lng',
-         'lat',
-         'Bedrooms',
-         'Bathrooms',
-         'Size',
-         'Balcony',
-         'Dishwasher',
-         'In Unit Laundry',
-         'On Site Laundry',
-         'Assigned Parking',
-         'Fitness Center',
-         'Garage Parking',
-         'Storage',
-         'Concierge Service',
-         'Swimming Pool',
-         'Price'
-]
+
+metrics = ScrapeMetrics()
 
 
 def jump_to(href):
@@ -88,29 +67,10 @@ def jump_to_listings_for(num_bedrooms, zone):
     jump_site = 'http://www.viewit.ca/vwListings.aspx?bedrooms={}&CID={}'.format(num_bedrooms, zone)
     jump_to(jump_site)
 
-def parse_to_int(attr_str, sqft=False):
-    if sqft and attr_str == '—':
-        return None
-    try:
-        if search('K', attr_str) is not None:
-            return float(sub(r'[^\d.]', '', attr_str))*1000
-        return int(sub(r'[^\d.]', '', attr_str))
-    except ValueError:
-        print(f'Found an unparseable attribute string: {attr_str}, sqft={sqft}')
-        return None
-
 def get_bedrooms(room_element):
     bedroom_str = room_element.find_element_by_class_name('Floorplan_title__179XB').text
-    if bedroom_str == "Studios":
-        num_beds = 0
-    else:
-        num_beds = int(bedroom_str[0])
-    # Check if listing has a den
     den_ind = room_element.find_element_by_class_name('Floorplan_floorplanTitle__3iB55').text
-    match = search(r'.+\s[dD]en.*', den_ind)
-    if match is not None:
-        num_beds += 0.5
-    return num_beds
+    return parse_bedrooms(bedroom_str, den_ind)
 
 def scrape_address():
     info_tbl = driver.find_element_by_class_name('SummaryTable_summaryTable__3zCmu')
@@ -133,9 +93,8 @@ def get_multiple_listings(attr_dict):
                 'Size': parse_to_int(room_comp[0].text, sqft=True),
                 'Price': parse_to_int(room_price.text)
             }
-            attr_dict_cpy = deepcopy(attr_dict)
-            attr_dict_cpy.update(room_attr)
-            listings.append(attr_dict_cpy)
+            room_attr.update(attr_dict)
+            listings.append(room_attr)
         except TimeoutException:
             pass
     return listings
@@ -144,19 +103,15 @@ def get_single_listing(attr_dict):
     room_comp_panel = driver.find_element_by_class_name('BubbleDetail_listingAmenities__37Cvp')
     room_comp = room_comp_panel.find_elements_by_class_name('BubbleDetail_imageText__33oD_')
     room_price = driver.find_element_by_class_name('BubbleDetail_colPrice__2mVzj').text
-    if search('STUDIO(S{0,1})|Studio(s{0,1})|Bachelor|ROOM', room_comp[0].text) is not None:
-        num_beds = 0
-    else:
-        num_beds = parse_to_int(room_comp[0].text)
+    num_beds = parse_single_bedrooms(room_comp[0].text)
     room_attr = {
             'Bedrooms': num_beds,
             'Bathrooms': parse_to_int(room_comp[1].text),
             'Size': parse_to_int(room_comp[4].text, sqft=True),
             'Price': parse_to_int(room_price)
     }
-    attr_dict_cpy = deepcopy(attr_dict)
-    attr_dict_cpy.update(room_attr)
-    return [attr_dict_cpy]
+    room_attr.update(attr_dict)
+    return [room_attr]
 
 def get_listings(attr_dict):
     rooms = attr_dict
@@ -187,18 +142,16 @@ def change_to_orig_window():
         driver.execute_script("arguments[0].scrollIntoView();", top_panel)
 
 def get_amenities():
-    attr_dict = deepcopy(AMENITIES)
+    texts = []
     try:
         panels = driver.find_elements_by_class_name('Amenities_amenities__w0bR_')
         for panel in panels:
             amenities = panel.find_elements_by_class_name('Amenities_text__3STBF')
-            for amenity in amenities:
-                if amenity.text in attr_dict.keys():
-                    attr_dict[amenity.text] += 1
+            texts.extend(amenity.text for amenity in amenities)
     except NoSuchElementException:
         pass
     finally:
-        return attr_dict
+        return {'Amenities': pack_amenities(texts)}
 
 def current_vit():
     parsed = urlparse(driver.current_url)
@@ -231,16 +184,21 @@ def find_rental():
         return None
 
 def check_listings():
-    with open('listings.json', 'r') as listings:
-        listings = json.load(listings)
-    print("Retrived seen listings...")
-    return listings
+    store = ListingStore()
+    print(f"Retrived {len(store)} seen listings...")
+    return store
+
+def build_dedup_index(store):
+    index = DedupIndex()
+    for row_id, row in store.iter_originals():
+        index.add(row, row_id)
+    return index
 
 def save_listings():
     print(f'Collected {len(seen_listings)} listings. Saving...')
-    to_file = json.dumps(seen_listings, indent=4)
-    with open('listings.json', 'w') as listings:
-        listings.write(to_file)
+    seen_listings.commit()
+    seen_listings.export_csv('rent_data.csv')
+    metrics.flush()
     print("Successfully saved seen listings.")
 
 
@@ -258,19 +216,11 @@ def short_sleep():
 def long_sleep():
     random_sleep(minimum=8, maximum=30)
 
-def check_for_existing():
-    # Get canonical url
-    c_url = driver.find_element_by_css_selector('[rel="canonical"]').get_attribute('href')
-    if c_url not in seen_listings:
-        seen_listings[c_url] = 1
-        return False
-    else:
-        return True
+def canonical_url():
+    return driver.find_element_by_css_selector('[rel="canonical"]').get_attribute('href')
 
 def traverse(bedroom_size, zone, auto, direct_import):
-    browser_log = driver.get_log('performance')
-    events = [process_browser_log_entry(entry) for entry in browser_log]
-    events = [event for event in events if 'Network.response' in event['method']]
+    events = network_responses()
     print(events)
     print(">> Checking for bedroom_size: {} in zone: {}".format(bedroom_size, zone))
     buffer = []
@@ -323,26 +273,24 @@ def scroll_and_click(selector=None, element=None):
     element.click()
 
 def init_writer():
-    fd = open('rent_data.csv', 'w')
-    with fd:
-        writer = csv.DictWriter(fd, fieldnames=ATTRS)
-        writer.writeheader()
+    dedup_index.clear()
+    seen_listings.clear_rows()
 
 def write_to_csv(attr_dicts):
-    fd = open('rent_data.csv', 'a')
-    with fd:
-        writer = csv.DictWriter(fd, fieldnames=ATTRS)
-        writer.writerows(attr_dicts)
-        # print(f'Wrote {len(attr_dicts)} entries to csv.')
-
-def main(init_csv=False):
-    print(f'Beginning scraping with init_csv={init_csv}')
+    # Rows are appended to the listing store and exported to rent_data.csv on save;
+    # units already scraped under another url are kept but flagged, and not exported
+    n_flagged = dedup_index.write(seen_listings, attr_dicts)
+    if n_flagged:
+        print(f'<< Flagged {n_flagged} near-duplicate rows.')
+
+def main(init_csv=False, capture=None):
+    print(f'Beginning scraping with init_csv={init_csv}, capture={capture is not None}')
     jump_to('')
     driver.find_element_by_css_selector('[aria-label="Display the results in List View"]').click()
     listings_batch = 0
-    pointer = 0
     if init_csv:
         init_writer()
+    pointer = seen_listings.get_pointer() # Resume where the last run stopped
     num_tries = 0
 
     # num_tries is the number of times to attempt getting reference before giving up
@@ -352,6 +300,8 @@ def main(init_csv=False):
         wait_for('.ListItem_listItem__1dHWi')
         listings = driver.find_elements_by_class_name('ListItem_listItem__1dHWi')
         listings = listings[pointer:] # Take only unseen listings
+        if not listings:
+            break # Reached the end of the list view
         for listing in listings:
             try:
                 scroll_and_click(None, listing)
@@ -365,66 +315,137 @@ def main(init_csv=False):
             num_tries = 0
             if (pointer + listings_batch) % 100 == 0:
                 print(f'Scraped {pointer + listings_batch} listings...')
+                metrics.flush()
             if (pointer + listings_batch) % 1000 == 0:
                 send_message(f'Scraped {pointer + listings_batch} listings.')
             try:
-                change_to_new_window()
+                with metrics.timer('page_load'):
+                    change_to_new_window()
                 seen = True
                 try:
                     address = scrape_address()
-                    seen = check_for_existing()
-                except Exception:
-                    pass
+                    canonical = canonical_url()
+                    seen = canonical in seen_listings
+                    if capture is not None and not seen:
+                        with metrics.timer('capture'):
+                            # Floorplan specs are only in the DOM once their panels are opened
+                            if not expand_floorplans(driver):
+                                raise TimeoutException('Floorplan panels did not expand')
+                            capture.add(driver.current_url, driver.page_source, network_responses())
+                        seen_listings.add(canonical)
+                except Exception as e:
+                    # Not marked seen, so a later pass retries it
+                    print(f'<< Could not read listing page: {e!r}')
+                    seen = True
                 finally:
                     change_to_orig_window()
                 if seen:
                     # print(f'Already saw this listing: {address}. Skipping...')
                     continue
                 print(f'New listing found: {address}')
+                if capture is not None:
+                    # Parsed offline by capture.py
+                    seen_listings.set_pointer(pointer + listings_batch)
+                    continue
                 short_sleep()
-                room_attrs = get_amenities()
-                room_attrs.update(get_coordinates(address))
-                rooms = get_listings(room_attrs)
-                write_to_csv(rooms)
+                with metrics.timer('geocode'):
+                    coordinates = geocode_cache.get(address)
+                with metrics.timer('parse'):
+                    room_attrs = get_amenities()
+                    room_attrs.update(coordinates)
+                    rooms = get_listings(room_attrs)
+                if not rooms:
+                    raise ValueError('no floorplan rows on the page')
+                with metrics.timer('write'):
+                    write_to_csv(rooms)
+                # Only listings whose rows were written count as seen, so failures are retried
+                seen_listings.add(canonical)
+                seen_listings.set_pointer(pointer + listings_batch)
             except (StaleElementReferenceException, NoSuchElementException, ElementNotInteractableException, ElementClickInterceptedException, TimeoutException, ValueError):
                 print(f'<< Could not retrieve listing attribute. Exiting listing ({pointer + listings_batch}).')
             finally:
                 driver.execute_script("window.history.go(-1)") # Go back to last page
         pointer += listings_batch
+        seen_listings.set_pointer(pointer)
         listings_batch = 0
 
     if num_tries >= 4:
         print("Unable to obtain non-stale reference to listing.")
         raise Exception
-    print('DONE! Scraped {pointer} listings.')
+    # Only an interrupted pass resumes from the pointer
+    seen_listings.clear_pointer()
+    print(f'DONE! Scraped {pointer} listings.')
+
+def main_pool(n_workers, capture=None):
+    # Collect listing links from the list view, then fetch them with a pool of browsers
+    print(f'Beginning pooled scraping with {n_workers} workers, capture={capture is not None}')
+    jump_to('')
+    driver.find_element_by_css_selector('[aria-label="Display the results in List View"]').click()
+    wait_for('.ListItem_listItem__1dHWi')
+    urls = listing_urls(driver.page_source, 'https://www.padmapper.com')[:MAX_LISTINGS]
+    print(f'Found {len(urls)} listings.')
+    make_fetcher = lambda: BrowserFetcher(make_driver)
+    if capture is not None:
+        errors = capture_pool(urls, capture, n_workers=n_workers, make_fetcher=make_fetcher,
+                              seen=seen_listings, metrics=metrics)
+    else:
+        errors = scrape_pool(urls, write_to_csv, geocode_cache.get, n_workers=n_workers,
+                             make_fetcher=make_fetcher, seen=seen_listings, metrics=metrics)
+    print(f'DONE! Scraped {len(urls) - len(errors)} listings.')
+
+def make_driver():
+    chromeOptions = webdriver.ChromeOptions()
+    caps = DesiredCapabilities.CHROME
+    caps['goog:loggingPrefs'] = {'performance': 'ALL'}
+    prefs = {'profile.managed_default_content_settings.images': 2}
+    chromeOptions.add_argument('--headless')
+    chromeOptions.add_experimental_option("prefs", prefs)
+    return webdriver.Chrome('/Users/matt/Documents/MyProjects/scraper/drivers/chromedriver', options=chromeOptions, desired_capabilities=caps)
 
 def process_browser_log_entry(entry):
     response = json.loads(entry['message'])['message']
     return response
 
+def network_responses():
+    # Only decode the network response events of the performance log
+    return [process_browser_log_entry(entry) for entry in driver.get_log('performance')
+            if 'Network.response' in entry['message']]
+
 if __name__ == '__main__':
+    driver = seen_listings = capture = None
     try:
-        chromeOptions = webdriver.ChromeOptions()
-        caps = DesiredCapabilities.CHROME
-        caps['goog:loggingPrefs'] = {'performance': 'ALL'}
-        prefs = {'profile.managed_default_content_settings.images': 2}
-        chromeOptions.add_argument('--headless')
-        chromeOptions.add_experimental_option("prefs", prefs)
-        driver = webdriver.Chrome('/Users/matt/Documents/MyProjects/scraper/drivers/chromedriver', options=chromeOptions, desired_capabilities=caps)
+        driver = make_driver()
         main_window = driver.current_window_handle
         seen_listings = check_listings()
-        opts, args = getopt(sys.argv[1:], "i:")
+        dedup_index = build_dedup_index(seen_listings)
+        geocode_cache = GeocodeCache(get_coordinates)
+        opts, args = getopt(sys.argv[1:], "i:w:c:")
         init_csv = False
+        n_workers = 0
         for opt, arg in opts:
             if opt == '-i' and arg == 'True':
                 init_csv = True
-        main(init_csv)
+            if opt == '-w':
+                n_workers = int(arg)
+            if opt == '-c':
+                capture = CaptureWriter(arg)
+        if n_workers > 0:
+            if init_csv:
+                init_writer()
+            main_pool(n_workers, capture)
+        else:
+            main(init_csv, capture)
     except Exception as e:
         filename = './errors/error_{}.png'.format(datetime.now())
-        print("Taking error screenshot to {}".format(filename))
-        driver.save_screenshot(filename)
+        if driver is not None:
+            print("Taking error screenshot to {}".format(filename))
+            driver.save_screenshot(filename)
         notify_error(e)
         raise e
     finally:
-        save_listings()
-        driver.quit()
+        if capture is not None:
+            capture.close()
+        if seen_listings is not None:
+            save_listings()
+        if driver is not None:
+            driver.quit()
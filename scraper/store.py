@@ -0,0 +1,186 @@
+import csv
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from listing_parser import AMENITIES, ATTRS
+
+STORE_PATH = 'listings.sqlite'
+LEGACY_LISTINGS_PATH = 'listings.json'
+LEGACY_ROWS_PATH = 'rent_data.csv'
+
+
+class ListingStore:
+    """
+    Crash-safe scrape state in a single SQLite file: seen canonical urls,
+    scraped rows and the list-view pointer. Writes are appended and committed
+    every `batch_size` operations, so a crash loses at most one batch and a
+    restarted scrape resumes from the saved pointer.
+    """
+
+    def __init__(self, path=STORE_PATH, batch_size=50, legacy_path=LEGACY_LISTINGS_PATH,
+                 legacy_rows_path=LEGACY_ROWS_PATH):
+        self.batch_size = batch_size
+        self.pending = 0
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        columns = ', '.join(f'"{attr}" REAL' for attr in ATTRS)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS seen (url TEXT PRIMARY KEY, seen_at REAL)')
+        self.conn.execute(f'CREATE TABLE IF NOT EXISTS rows (id INTEGER PRIMARY KEY, {columns}, duplicate_of INTEGER)')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT)')
+        self._pack_legacy_amenities()
+        self._add_duplicate_marker()
+        self.conn.commit()
+        if legacy_path and os.path.exists(legacy_path) and len(self) == 0:
+            self._import_legacy(legacy_path)
+        if self._get_state('rows_migrated') is None:
+            # Checked once per store: afterwards rent_data.csv is only ever an export of `rows`
+            if legacy_rows_path and os.path.exists(legacy_rows_path) and self.n_rows() == 0:
+                self._import_legacy_rows(legacy_rows_path)
+            with self.lock:
+                self.conn.execute("INSERT OR REPLACE INTO state VALUES ('rows_migrated', '1')")
+                self.conn.commit()
+
+    def _pack_legacy_amenities(self):
+        # Stores created before amenities were bit-packed have one column per amenity
+        columns = {row[1] for row in self.conn.execute('PRAGMA table_info(rows)')}
+        if 'Amenities' in columns:
+            return
+        packed = ' + '.join(f'((COALESCE("{amenity}", 0) > 0) << {bit})' for bit, amenity in enumerate(AMENITIES))
+        self.conn.execute('ALTER TABLE rows ADD COLUMN "Amenities" REAL')
+        self.conn.execute(f'UPDATE rows SET "Amenities" = {packed}')
+
+    def _add_duplicate_marker(self):
+        # Stores created before near-duplicates were flagged have no duplicate_of column
+        columns = {row[1] for row in self.conn.execute('PRAGMA table_info(rows)')}
+        if 'duplicate_of' not in columns:
+            self.conn.execute('ALTER TABLE rows ADD COLUMN duplicate_of INTEGER')
+
+    def _import_legacy(self, path):
+        # One-off migration from the listings.json blob written by earlier scrapes
+        with open(path, 'r') as listings:
+            urls = json.load(listings)
+        now = time.time()
+        with self.lock:
+            self.conn.executemany('INSERT OR IGNORE INTO seen VALUES (?, ?)', [(url, now) for url in urls])
+            self.conn.commit()
+        print(f'Imported {len(urls)} seen listings from {path}.')
+
+    def _import_legacy_rows(self, path):
+        # Rows scraped before the store existed only live in rent_data.csv; without
+        # them the first export_csv would overwrite that history
+        with open(path, 'r', newline='') as fd:
+            rows = list(csv.DictReader(fd))
+        attr_dicts = []
+        for row in rows:
+            attr_dict = {attr: float(row[attr]) if row.get(attr) not in (None, '') else None for attr in ATTRS}
+            if attr_dict['Amenities'] is None:
+                # Older files have one count column per amenity
+                attr_dict['Amenities'] = float(sum(1 << bit for bit, amenity in enumerate(AMENITIES)
+                                                   if float(row.get(amenity) or 0) > 0))
+            attr_dicts.append(attr_dict)
+        self.write_rows(attr_dicts)
+        self.commit()
+        print(f'Imported {len(attr_dicts)} rows from {path}.')
+
+    def _written(self, n=1):
+        self.pending += n
+        if self.pending >= self.batch_size:
+            self.commit()
+
+    def commit(self):
+        with self.lock:
+            self.conn.commit()
+            self.pending = 0
+
+    def add(self, url):
+        # True if the url had not been seen before
+        with self.lock:
+            cursor = self.conn.execute('INSERT OR IGNORE INTO seen VALUES (?, ?)', (url, time.time()))
+            self._written()
+            return cursor.rowcount == 1
+
+    def __contains__(self, url):
+        with self.lock:
+            return self.conn.execute('SELECT 1 FROM seen WHERE url = ?', (url,)).fetchone() is not None
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM seen').fetchone()[0]
+
+    def write_rows(self, attr_dicts, duplicate_of=None):
+        # Ids of the new rows; duplicate_of holds, per row, the id of the row it
+        # near-duplicates (see dedup.py) or None
+        placeholders = ', '.join('?' * (len(ATTRS) + 1))
+        columns = ', '.join(f'"{attr}"' for attr in ATTRS)
+        duplicate_of = duplicate_of if duplicate_of is not None else [None] * len(attr_dicts)
+        values = [tuple(attr_dict.get(attr) for attr in ATTRS) + (original,)
+                  for attr_dict, original in zip(attr_dicts, duplicate_of)]
+        with self.lock:
+            row_ids = [self.conn.execute(f'INSERT INTO rows ({columns}, duplicate_of) VALUES ({placeholders})', row).lastrowid
+                       for row in values]
+            self._written(len(values))
+        return row_ids
+
+    def n_rows(self):
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM rows').fetchone()[0]
+
+    def clear_rows(self):
+        with self.lock:
+            self.conn.execute('DELETE FROM rows')
+            self.clear_pointer()
+
+    def _get_state(self, key):
+        with self.lock:
+            row = self.conn.execute('SELECT value FROM state WHERE key = ?', (key,)).fetchone()
+        return row[0] if row is not None else None
+
+    def get_pointer(self):
+        pointer = self._get_state('pointer')
+        return int(pointer) if pointer is not None else 0
+
+    def clear_pointer(self):
+        # A finished pass starts the next run from the top of the list view
+        with self.lock:
+            self.conn.execute("DELETE FROM state WHERE key = 'pointer'")
+            self.commit()
+
+    def set_pointer(self, pointer):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO state VALUES ('pointer', ?)", (str(pointer),))
+            self._written()
+
+    def iter_rows(self, include_duplicates=True):
+        columns = ', '.join(f'"{attr}"' for attr in ATTRS)
+        where = '' if include_duplicates else 'WHERE duplicate_of IS NULL '
+        with self.lock:
+            rows = self.conn.execute(f'SELECT {columns} FROM rows {where}ORDER BY id').fetchall()
+        for row in rows:
+            yield dict(zip(ATTRS, row))
+
+    def iter_originals(self):
+        # (id, row) of every row not flagged as a near-duplicate
+        columns = ', '.join(f'"{attr}"' for attr in ATTRS)
+        with self.lock:
+            rows = self.conn.execute(f'SELECT id, {columns} FROM rows WHERE duplicate_of IS NULL ORDER BY id').fetchall()
+        for row in rows:
+            yield row[0], dict(zip(ATTRS, row[1:]))
+
+    def export_csv(self, path='rent_data.csv', include_duplicates=False):
+        # rent_data.csv for the loader; integral values are written without '.0'.
+        # Flagged near-duplicates stay in the store and are left out unless asked for
+        with open(path, 'w', newline='') as fd:
+            writer = csv.DictWriter(fd, fieldnames=ATTRS)
+            writer.writeheader()
+            for row in self.iter_rows(include_duplicates):
+                writer.writerow({k: int(v) if isinstance(v, float) and v.is_integer() and k not in ('lng', 'lat') else v
+                                 for k, v in row.items()})
+
+    def close(self):
+        self.commit()
+        self.conn.close()
@@ -0,0 +1,53 @@
+import csv
+import os
+import tempfile
+import unittest
+
+from dedup import DedupIndex
+from store import ListingStore
+
+ROW = {'lng': -79.38, 'lat': 43.65, 'Bedrooms': 1, 'Bathrooms': 1, 'Size': 600, 'Amenities': 3, 'Price': 2100}
+
+
+class DedupStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.store = ListingStore(os.path.join(self.dir.name, 'listings.sqlite'), legacy_path=None, legacy_rows_path=None)
+
+    def tearDown(self):
+        self.store.close()
+        self.dir.cleanup()
+
+    def export(self, **kwargs):
+        path = os.path.join(self.dir.name, 'rent_data.csv')
+        self.store.export_csv(path, **kwargs)
+        with open(path, newline='') as f:
+            return list(csv.DictReader(f))
+
+    def test_duplicates_are_flagged_not_dropped(self):
+        index = DedupIndex()
+        self.assertEqual(index.write(self.store, [ROW, dict(ROW, Bedrooms=2)]), 0)
+        self.assertEqual(index.write(self.store, [dict(ROW, Price=2105)]), 1)
+        self.assertEqual(index.write(self.store, [dict(ROW, Size=650)]), 0)
+
+        self.assertEqual(self.store.n_rows(), 4)
+        self.assertEqual(len(self.export()), 3)
+        self.assertEqual(len(self.export(include_duplicates=True)), 4)
+
+    def test_rows_without_size_need_identical_coordinates(self):
+        index = DedupIndex()
+        unsized = dict(ROW, Size=None)
+        index.write(self.store, [unsized])
+        self.assertEqual(index.write(self.store, [dict(unsized, lng=ROW['lng'] + 1e-4)]), 0)
+        self.assertEqual(index.write(self.store, [dict(unsized)]), 1)
+
+    def test_index_rebuilt_from_store(self):
+        DedupIndex().write(self.store, [ROW])
+        index = DedupIndex()
+        for row_id, row in self.store.iter_originals():
+            index.add(row, row_id)
+        self.assertEqual(index.find(dict(ROW)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
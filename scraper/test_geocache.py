@@ -0,0 +1,75 @@
+import os
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from geocache import GeocodeCache, normalize_address
+
+
+class StubGeocoder:
+    # Counts calls per address; blocks until released so lookups overlap
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, address):
+        with self.lock:
+            self.calls.append(address)
+        self.release.wait(5)
+        if 'Nowhere' in address:
+            return None
+        return {'lng': -79.0 - len(address) / 1000, 'lat': 43.0 + len(address) / 1000}
+
+
+class GeocodeCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.geocoder = StubGeocoder()
+        self.cache = GeocodeCache(self.geocoder, os.path.join(self.dir.name, 'geocode_cache.sqlite'), ttl=3600)
+
+    def tearDown(self):
+        self.cache.close()
+        self.dir.cleanup()
+
+    def test_normalized_addresses_share_an_entry(self):
+        self.assertEqual(normalize_address('1203 - 12 King Street West, Toronto'), normalize_address('12 king st w toronto'))
+        first = self.cache.get('12 King Street West, Toronto')
+        self.assertEqual(self.cache.get('1203 - 12 King St W, Toronto'), first)
+        self.assertEqual(len(self.geocoder.calls), 1)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_in_flight_lookups_are_coalesced(self):
+        self.geocoder.release.clear()
+        with ThreadPoolExecutor(8) as pool:
+            futures = [pool.submit(self.cache.get, '12 King St W, Toronto') for _ in range(8)]
+            while not self.geocoder.calls:
+                threading.Event().wait(0.01)
+            threading.Event().wait(0.2) # Let the other lookups reach the in-flight call
+            self.geocoder.release.set()
+            results = [future.result(timeout=5) for future in futures]
+        self.assertEqual(len(self.geocoder.calls), 1)
+        self.assertTrue(all(result == results[0] for result in results))
+
+    def test_expired_entries_are_geocoded_again(self):
+        self.cache.get('12 King St W, Toronto')
+        with self.cache.lock:
+            self.cache.conn.execute('UPDATE geocodes SET fetched_at = fetched_at - 7200')
+        self.cache.get('12 King St W, Toronto')
+        self.assertEqual(len(self.geocoder.calls), 2)
+
+    def test_get_many(self):
+        self.cache.get('1 Yonge St, Toronto')
+        addresses = ['12 King St W, Toronto', '1 Yonge St, Toronto', '12 King Street West, Toronto', '1 Nowhere Rd']
+        results = self.cache.get_many(addresses, n_workers=2)
+        self.assertEqual(results[0], results[2])
+        self.assertEqual(results[1], self.cache.get('1 Yonge St, Toronto'))
+        self.assertIsNone(results[3])
+        # One call each for the first lookup, King St and the failed address
+        self.assertEqual(sorted(self.geocoder.calls), sorted(['1 Yonge St, Toronto', '12 King St W, Toronto', '1 Nowhere Rd']))
+
+
+if __name__ == '__main__':
+    unittest.main()
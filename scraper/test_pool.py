@@ -0,0 +1,113 @@
+import os
+import tempfile
+import unittest
+
+from pool import FLOORPLAN_SPEC, BrowserFetcher, SeenSet, expand_floorplans, scrape_pool, serve_fixtures
+
+PAGE = '''<html><head><link rel="canonical" href="{canonical}"></head><body>
+<ul class="SummaryTable_summaryTable__3zCmu">
+<li><div>12 King St W, Toronto</div></li><li><div>x</div></li><li><div>y</div></li>
+</ul>
+<div class="Amenities_amenities__w0bR_"><span class="Amenities_text__3STBF">Balcony</span></div>
+{floorplans}
+</body></html>'''
+
+FLOORPLAN = '''<div class="Floorplan_floorplansContainer__2Rtwg">
+<div class="Floorplan_floorplanPanel__25nE5"><span class="Floorplan_title__179XB">{beds} Bedroom</span>
+<span class="Floorplan_floorplanTitle__3iB55">Unit</span></div>
+<span class="Floorplan_floorplanPrice__230Qt">${price}</span>
+{specs}
+</div>'''
+
+SPECS = '''<span class="Floorplan_specLabel__1ZbKH">{size} sqft</span>
+<span class="Floorplan_specLabel__1ZbKH">1 Bath</span>'''
+
+
+def page(canonical, expanded=True):
+    floorplans = ''.join(
+        FLOORPLAN.format(beds=beds, price=price, specs=SPECS.format(size=size) if expanded else '')
+        for beds, price, size in [(1, 2100, 600), (2, 2900, 850)])
+    return PAGE.format(canonical=canonical, floorplans=floorplans)
+
+
+class ScrapePoolTest(unittest.TestCase):
+    # Runs the pool against saved pages served from a local fixture server
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        pages = {
+            'expanded.html': page('https://example.com/expanded'),
+            'collapsed.html': page('https://example.com/collapsed', expanded=False),
+        }
+        for name, html in pages.items():
+            with open(os.path.join(self.dir.name, name), 'w') as f:
+                f.write(html)
+        self.server, self.base_url = serve_fixtures(self.dir.name)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.dir.cleanup()
+
+    def test_rows_written_and_failures_not_marked_seen(self):
+        rows, seen = [], SeenSet()
+        urls = [self.base_url + name for name in ('expanded.html', 'collapsed.html', 'missing.html')]
+        errors = scrape_pool(urls, rows.extend, lambda address: {'lng': -79.38, 'lat': 43.65},
+                             n_workers=2, rate=100, burst=3, seen=seen)
+
+        self.assertEqual(sorted(errors), sorted(urls[1:]))
+        self.assertEqual([(row['Bedrooms'], row['Size'], row['Price']) for row in rows],
+                         [(1, 600, 2100), (2, 850, 2900)])
+        self.assertIn('https://example.com/expanded', seen)
+        self.assertNotIn('https://example.com/collapsed', seen)
+        self.assertEqual(len(seen), 1)
+
+
+class FakeElement:
+    def __init__(self, expanded=False):
+        self.expanded = expanded
+
+    def find_elements_by_class_name(self, cls):
+        if cls == FLOORPLAN_SPEC:
+            return [object()] if self.expanded else []
+        return [self]
+
+
+class FakeDriver:
+    def __init__(self, containers):
+        self.containers = containers
+
+    def find_elements_by_class_name(self, cls):
+        return self.containers
+
+    def execute_script(self, script, element):
+        element.expanded = True
+
+
+class StuckDriver(FakeDriver):
+    # Panels that never render their specs
+    page_source = ''
+
+    def get(self, url):
+        pass
+
+    def execute_script(self, script, element):
+        pass
+
+
+class ExpandFloorplansTest(unittest.TestCase):
+    def test_clicks_collapsed_panels(self):
+        containers = [FakeElement(expanded=True), FakeElement()]
+        self.assertTrue(expand_floorplans(FakeDriver(containers), timeout=0.5))
+        self.assertTrue(all(container.expanded for container in containers))
+
+    def test_collapsed_page_fails_fetch(self):
+        driver = StuckDriver([FakeElement()])
+        self.assertFalse(expand_floorplans(driver, timeout=0.2))
+        fetcher = BrowserFetcher(lambda: driver)
+        with self.assertRaises(TimeoutError):
+            fetcher.fetch('https://example.com/collapsed')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+
+class SharedArrays:
+    """
+    Copies a dict of named arrays into shared memory once so that pool workers
+    can read them through attach() without pickling a copy per task.
+    """
+
+    def __init__(self, arrays):
+        self._blocks = []
+        self.specs = {}
+        for name, arr in arrays.items():
+            arr = np.ascontiguousarray(arr)
+            shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+            np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+            self._blocks.append(shm)
+            self.specs[name] = (shm.name, arr.shape, arr.dtype.str)
+
+    def close(self):
+        for shm in self._blocks:
+            shm.close()
+            shm.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _open_block(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 registers attached blocks with the resource tracker, which
+        # would unlink them when the worker exits; the parent owns their lifetime
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+def attach(specs):
+    """
+    Read-only views onto arrays shared by SharedArrays. The returned blocks must
+    be kept alive for as long as the arrays are used.
+    """
+    arrays, blocks = {}, []
+    for name, (shm_name, shape, dtype) in specs.items():
+        shm = _open_block(shm_name)
+        arr = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        arr.flags.writeable = False
+        arrays[name] = arr
+        blocks.append(shm)
+    return arrays, blocks
@@ -0,0 +1,67 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from comparables import Comparables
+
+
+def random_listings(n, seed=69):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'lng': rng.uniform(-79.6, -79.2, n),
+        'lat': rng.uniform(43.6, 43.8, n),
+        'Bedrooms': rng.integers(1, 3, n).astype(np.float32),
+        'Bathrooms': rng.integers(1, 3, n).astype(np.float32),
+        'Amenities': rng.integers(0, 1 << 10, n).astype(np.uint16),
+        'Price': rng.uniform(1., 5., n),
+    }, index=rng.permutation(10 * n)[:n])
+
+
+class QueryTest(unittest.TestCase):
+    # The brute-force and tree paths must return the same comparables
+    @classmethod
+    def setUpClass(cls):
+        cls.data_matrix = random_listings(4000)
+        cls.comparables = Comparables(cls.data_matrix)
+        cls.labels = cls.data_matrix.index[:200].to_numpy()
+
+    def query_both(self, **kwargs):
+        results = []
+        for brute_force_max in (len(self.data_matrix), -1):
+            with mock.patch('comparables.BRUTE_FORCE_MAX', brute_force_max):
+                results.append(self.comparables.query_index(self.labels, self.data_matrix, k=10, **kwargs))
+        return results
+
+    def assertSameResults(self, results):
+        (brute_labels, brute_dist), (tree_labels, tree_dist) = results
+        np.testing.assert_array_equal(brute_labels, tree_labels)
+        np.testing.assert_allclose(brute_dist, tree_dist)
+
+    def test_nearest(self):
+        results = self.query_both()
+        self.assertSameResults(results)
+        labels, distances = results[0]
+        self.assertFalse((labels == self.labels[:, None]).any())
+        self.assertTrue((np.diff(distances, axis=1) >= 0).all())
+
+    def test_amenities_and_price_range(self):
+        results = self.query_both(amenities=['Balcony', 'Dishwasher'], price_range=(2., 3.))
+        self.assertSameResults(results)
+        labels = results[0][0]
+        found = self.data_matrix.loc[labels[labels >= 0].ravel()]
+        self.assertTrue(found['Price'].between(2., 3.).all())
+        self.assertTrue(((found['Amenities'].to_numpy() & 3) == 3).all())
+
+    def test_sparse_filter_pads(self):
+        results = self.query_both(amenities=['Balcony', 'Dishwasher', 'Storage', 'Swimming Pool'],
+                                  price_range=(4.9, 5.))
+        self.assertSameResults(results)
+        labels, distances = results[0]
+        self.assertTrue((labels == -1).any())
+        self.assertTrue(np.isinf(distances[labels == -1]).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import tempfile
+import unittest
+
+import numpy as np
+from ngboost import NGBRegressor
+from sklearn.linear_model import Ridge
+
+from compiled_model import CompiledModel, compile_model
+
+
+def synthetic(n=1000, n_features=6, seed=69):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, n_features))
+    y = 2. + X[:, 0] - 0.5 * X[:, 1] ** 2 + rng.normal(scale=0.2 + 0.1 * np.abs(X[:, 2]), size=n)
+    return X, y
+
+
+class CompiledModelTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        X, cls.y = synthetic()
+        cls.X_train, cls.X_test = X[:800], X[800:]
+        # Column subsampling so the per-stage col_idxs are exercised
+        cls.model = NGBRegressor(n_estimators=50, col_sample=0.5, verbose=False, random_state=69)
+        cls.model.fit(cls.X_train, cls.y[:800])
+
+    def assertSameDist(self, compiled, X):
+        expected = self.model.pred_dist(X)
+        dist = compiled.pred_dist(X)
+        np.testing.assert_allclose(dist.loc, expected.params['loc'], rtol=1e-7, atol=1e-9)
+        np.testing.assert_allclose(dist.scale, expected.params['scale'], rtol=1e-7)
+        np.testing.assert_allclose(dist.logpdf(self.y[800:]), expected.logpdf(self.y[800:]), rtol=1e-7, atol=1e-9)
+
+    def test_matches_ngboost(self):
+        self.assertSameDist(compile_model(self.model), self.X_test)
+
+    def test_small_chunks(self):
+        compiled = compile_model(self.model)
+        expected = compiled.pred_param(self.X_test)
+        np.testing.assert_array_equal(compiled.pred_param(self.X_test, max_elements=1), expected)
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as path:
+            compile_model(self.model).save(path)
+            self.assertSameDist(CompiledModel.load(path), self.X_test)
+
+    def test_rejects_other_base_learners(self):
+        model = NGBRegressor(Base=Ridge(), n_estimators=5, verbose=False).fit(self.X_train, self.y[:800])
+        with self.assertRaises(ValueError):
+            compile_model(model)
+
+
+if __name__ == '__main__':
+    unittest.main()
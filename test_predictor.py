@@ -0,0 +1,50 @@
+import unittest
+
+import numpy as np
+from ngboost import NGBRegressor
+
+from data_loader import iter_data_matrix
+from predictor import MicroBatcher, RentPredictor
+from preprocessing import pipeline
+
+LISTING = {'lng': -79.3832, 'lat': 43.6532, 'Bedrooms': 1, 'Bathrooms': 1, 'Size': 600, 'Amenities': 3}
+
+
+def fitted_predictor(n_rows=2000, n_estimators=20):
+    # Small predictor fitted on the first rows of data/rent_data.csv
+    data_matrix = next(iter_data_matrix(chunksize=n_rows))
+    X, y = data_matrix.drop('Price', axis=1), data_matrix['Price']
+    data_pipeline = pipeline()
+    model = NGBRegressor(n_estimators=n_estimators, verbose=False, random_state=69)
+    model.fit(data_pipeline.fit_transform(X.copy()), y.to_numpy())
+    return RentPredictor(data_pipeline, model)
+
+
+class ScoreListingsTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.predictor = fitted_predictor()
+
+    def test_lone_listing_without_optional_attrs(self):
+        listing = {attr: LISTING[attr] for attr in ('lng', 'lat', 'Bedrooms', 'Bathrooms')}
+        result, = self.predictor.score_listings([listing])
+        self.assertTrue(np.isfinite(result['mean']))
+
+    def test_result_does_not_depend_on_batch(self):
+        listing = {attr: LISTING[attr] for attr in ('lng', 'lat', 'Bedrooms', 'Bathrooms')}
+        alone, = self.predictor.score_listings([listing])
+        batched = self.predictor.score_listings([LISTING, listing])[1]
+        self.assertAlmostEqual(alone['mean'], batched['mean'])
+        self.assertAlmostEqual(alone['sigma'], batched['sigma'])
+
+    def test_micro_batcher_rejects_malformed_listing(self):
+        batcher = MicroBatcher(self.predictor, max_wait=0.01)
+        bad = batcher.submit({'lng': 'east', 'lat': 43.65, 'Bedrooms': 1, 'Bathrooms': 1})
+        good = batcher.submit(LISTING)
+        with self.assertRaises(ValueError):
+            bad.result(timeout=10)
+        self.assertTrue(np.isfinite(good.result(timeout=10)['mean']))
+
+
+if __name__ == '__main__':
+    unittest.main()
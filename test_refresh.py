@@ -0,0 +1,41 @@
+import unittest
+
+import numpy as np
+
+from data_loader import iter_data_matrix
+from refresh import init_state, refresh
+from test_predictor import fitted_predictor
+
+
+class RefreshTest(unittest.TestCase):
+    def setUp(self):
+        self.predictor = fitted_predictor(n_estimators=20)
+        chunks = iter_data_matrix(chunksize=2000)
+        next(chunks) # Training rows of fitted_predictor
+        holdout, new = next(chunks), next(chunks)
+        self.predictor.refresh_state = init_state(self.predictor, holdout.drop('Price', axis=1), holdout['Price'])
+        self.X, self.y = new.drop('Price', axis=1), new['Price']
+
+    def test_appends_stages_and_keeps_init_params(self):
+        model = self.predictor.model
+        init_params = np.array(model.init_params, copy=True)
+        predictor, metrics = refresh(self.predictor, self.X, self.y, n_stages=5,
+                                     max_mean_shift=np.inf, max_nll_increase=np.inf)
+        self.assertFalse(metrics['retrained'])
+        self.assertEqual(len(predictor.model.base_models), 25)
+        self.assertEqual(predictor.model.n_estimators, 20)
+        np.testing.assert_array_equal(predictor.model.init_params, init_params)
+        self.assertNotIn('fit_init_params_to_marginal', vars(predictor.model))
+        self.assertEqual(predictor.refresh_state['n_refreshes'], 1)
+
+    def test_drift_triggers_retrain(self):
+        X_old, y_old = self.X.iloc[:0], self.y.iloc[:0]
+        predictor, metrics = refresh(self.predictor, self.X, self.y, history=lambda: (X_old, y_old),
+                                     max_mean_shift=-1)
+        self.assertTrue(metrics['retrained'])
+        self.assertIsNot(predictor, self.predictor)
+        self.assertEqual(len(predictor.model.base_models), 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
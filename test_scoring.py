@@ -0,0 +1,57 @@
+import csv
+import tempfile
+import unittest
+
+import numpy as np
+
+from amenities import AMENITY_ATTRS
+from data_loader import RENT_LISTINGS_PATH
+from scoring import Scorer, export_scorer
+from test_predictor import fitted_predictor
+
+
+def csv_listings(n=500):
+    # Listings as rent_price.py score reads them: strings, older files with per-amenity columns
+    with open(RENT_LISTINGS_PATH, newline='') as f:
+        listings = [row for _, row in zip(range(n), csv.DictReader(f))]
+    listings.append({'lng': '-79.3832', 'lat': '43.6532', 'Bedrooms': '1', 'Bathrooms': '11', 'Size': ''})
+    listings.append({'lng': '-80.5', 'lat': '43.45', 'Bedrooms': '1', 'Bathrooms': '1', 'Size': '600'})
+    return listings
+
+def as_numbers(listing):
+    return {attr: float(value) if value != '' else None for attr, value in listing.items()}
+
+
+class ScorerParityTest(unittest.TestCase):
+    # The NumPy-only scorer must reproduce RentPredictor.score_listings
+    @classmethod
+    def setUpClass(cls):
+        cls.predictor = fitted_predictor()
+        cls.dir = tempfile.TemporaryDirectory()
+        export_scorer(cls.predictor, cls.dir.name)
+        cls.scorer = Scorer.load(cls.dir.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.dir.cleanup()
+
+    def test_matches_predictor(self):
+        listings = csv_listings()
+        self.assertIn(AMENITY_ATTRS[0], listings[0])
+        expected = self.predictor.score_listings([as_numbers(listing) for listing in listings])
+        results = self.scorer.score_listings(listings)
+
+        self.assertEqual([result is None for result in results], [result is None for result in expected])
+        self.assertIsNone(results[-1]) # Outside Toronto
+        scored = [i for i, result in enumerate(expected) if result is not None]
+        for key in ('mean', 'sigma'):
+            np.testing.assert_allclose([results[i][key] for i in scored], [expected[i][key] for i in scored], rtol=1e-5)
+        np.testing.assert_allclose([list(results[i]['quantiles'].values()) for i in scored],
+                                   [list(expected[i]['quantiles'].values()) for i in scored], rtol=1e-5)
+
+    def test_empty(self):
+        self.assertEqual(self.scorer.score_listings([]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+from hyperopt import hp, tpe, space_eval, Trials, STATUS_OK, STATUS_FAIL, JOB_STATE_DONE
+from hyperopt.base import Domain, spec_from_misc
+from ngboost import NGBRegressor
+from sklearn.model_selection import train_test_split
+from sklearn.tree import DecisionTreeRegressor
+
+import data_loader
+from preprocessing import pipeline
+from shared import SharedArrays, attach
+
+N_NEIGHBORS = [3, 5, 10]
+MUL = [True, False]
+
+# Decision Tree hyperparameters
+TREE_HP = []
+for max_f in ['sqrt', 'log2', 0.5, 0.75]: # Subsample columns
+    for max_d in [1, 3, 5, 6]: # Subsample rows
+        TREE_HP.append(DecisionTreeRegressor(
+            max_features=max_f,
+            max_depth=max_d,
+            random_state=69))
+
+SPACE = {
+    'model': {
+        'learning_rate': hp.uniform('learning_rate', .005, 0.5),
+        'minibatch_frac': hp.choice('minibatch_frac', [1.0, 0.8, 0.7, 0.6]),
+        'Base': hp.choice('Base', TREE_HP),
+        'n_estimators': hp.choice('n_estimators', [100, 500, 1000, 2000])
+    },
+    'preprocessing': {
+        'n_neighbors': hp.choice('n_neighbors', N_NEIGHBORS),
+        'mul': hp.choice('mul', MUL)
+    }
+}
+
+DEFAULT_MODEL_PARAMS = {
+    'verbose': False,
+    'random_state': 69
+}
+
+# Matrices shared by the parent process, attached once per worker
+_ARRAYS = {}
+_BLOCKS = []
+
+
+def _key(n_neighbors, mul):
+    return f'{n_neighbors}-{mul}'
+
+def load_tuning_data(test_prop=0.2, val_prop=0.1):
+    rent = data_loader.train_test_split(test_prop=test_prop)
+    X_train, X_val, y_train, y_val = train_test_split(
+        rent['train']['data'], rent['train']['labels'], test_size=val_prop)
+    return X_train, X_val, y_train, y_val
+
+def preprocess_configs(X_train, X_val, y_train, y_val):
+    # Fit each distinct preprocessing config once instead of once per trial
+    arrays = {
+        'y_train': np.asarray(y_train, dtype=np.float64),
+        'y_val': np.asarray(y_val, dtype=np.float64)
+    }
+    for n_neighbors in N_NEIGHBORS:
+        for mul in MUL:
+            data_pipeline = pipeline(n_neighbors=n_neighbors, mul=mul)
+            key = _key(n_neighbors, mul)
+            arrays[key + '/train'] = data_pipeline.fit_transform(X_train)
+            arrays[key + '/val'] = data_pipeline.transform(X_val)
+    return arrays
+
+def _init_worker(specs):
+    global _ARRAYS, _BLOCKS
+    _ARRAYS, _BLOCKS = attach(specs)
+    warnings.simplefilter("ignore")
+
+def _objective(params):
+    key = _key(**params['preprocessing'])
+    model_params = dict(params['model'], **DEFAULT_MODEL_PARAMS)
+    try:
+        ngb = NGBRegressor(**model_params).fit(
+            _ARRAYS[key + '/train'], _ARRAYS['y_train'],
+            X_val=_ARRAYS[key + '/val'], Y_val=_ARRAYS['y_val'],
+            early_stopping_rounds=5)
+    except Exception as e:
+        return {'status': STATUS_FAIL, 'failure': repr(e)}
+    loss = ngb.evals_result['val']['LOGSCORE'][ngb.best_val_loss_itr]
+    return {'loss': loss, 'status': STATUS_OK}
+
+def _suggest(domain, trials, n, rstate, algo):
+    # TPE proposes one point per call; draw n with different seeds for a parallel round
+    docs = []
+    for new_id in trials.new_trial_ids(n):
+        docs.extend(algo([new_id], domain, trials, rstate.integers(2 ** 31 - 1)))
+    return docs
+
+def tune(X_train, X_val, y_train, y_val, max_evals=100, n_workers=None, algo=tpe.suggest, seed=69):
+    """
+    TPE search over SPACE with trials evaluated n_workers at a time in a process
+    pool. Returns the best parameters and the hyperopt Trials object.
+    """
+    n_workers = n_workers or os.cpu_count()
+    domain = Domain(_objective, SPACE)
+    trials = Trials()
+    rstate = np.random.default_rng(seed)
+
+    print('Preprocessing data for each pipeline config...')
+    arrays = preprocess_configs(X_train, X_val, y_train, y_val)
+
+    print('Beginning hyperparameter tuning...')
+    with SharedArrays(arrays) as shared, \
+            ProcessPoolExecutor(n_workers, initializer=_init_worker, initargs=(shared.specs,)) as pool:
+        while len(trials) < max_evals:
+            trials.refresh()
+            docs = _suggest(domain, trials, min(n_workers, max_evals - len(trials)), rstate, algo)
+            params = [space_eval(SPACE, spec_from_misc(doc['misc'])) for doc in docs]
+            for doc, result in zip(docs, pool.map(_objective, params)):
+                doc['state'] = JOB_STATE_DONE
+                doc['result'] = result
+                doc['refresh_time'] = datetime.now()
+            trials.insert_trial_docs(docs)
+            trials.refresh()
+            print(f'Finished {len(trials)}/{max_evals} trials. Best loss: {min(trials.losses(), key=_loss_key)}')
+    print('Finished tuning!')
+
+    best = space_eval(SPACE, spec_from_misc(trials.best_trial['misc']))
+    return best, trials
+
+def _loss_key(loss):
+    return np.inf if loss is None else loss
+
+
+if __name__ == '__main__':
+    best_params, _ = tune(*load_tuning_data())
+    print(best_params)